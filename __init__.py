@@ -9,24 +9,37 @@ RELOAD_DEBOUNCE_S = 1.0
 import os
 import re
 import sys
+import time
 import traceback
-import importlib
-import importlib.util
 
 import bpy
+import numpy
 from bpy.app.handlers import persistent
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-from setup_venv import setup_venv
-venv_dir = setup_venv()
-
-from poll import watch_for_text_changes
-
-cadquery = None
-build123d = None
+from setup_venv import venv_directory
+from dependencies import DependencyCheck
+from blendquery import regenerate_blendquery_object, mesh_registry
+from poll import watch_for_text_changes, watch_for_file_changes
+from worker import create_worker, discard
+from buffers import remove_stale_buffers, release_buffers
+from cache import TessellationCache, cache_key
+from interop_types import BuildOptions
+from parameters import script_parameters
+from modules import helper_sources
+from profiling import log_build, format_bytes
+from scheduler import PRIORITY_ACTIVE, PRIORITY_SELECTED, PRIORITY_DEFAULT, can_measure_rss
+
+# Long-lived build worker, which keeps CadQuery and Build123d imported between regenerations
+worker = create_worker()
+# Results of previous builds, which lets reopening a file or undoing a script edit skip the worker entirely
+tessellation_cache = TessellationCache()
 
 # TODO: Find a better way to store/reset
 are_dependencies_installed = False
+# Runs off the main thread so that neither enabling the add-on nor opening a file waits on the virtual environment
+dependency_check = DependencyCheck()
+DEPENDENCY_POLL_S = 0.1
 
 def statusbar_progress_bar(self, context):
     if bpy.context.window_manager.blendquery.is_regenerating:
@@ -41,11 +54,14 @@ def statusbar_progress_bar(self, context):
 
 
 def register():
+    bpy.utils.register_class(BlendQueryPreferences)
     bpy.utils.register_class(ObjectPropertyGroup)
+    bpy.utils.register_class(ParameterPropertyGroup)
     bpy.utils.register_class(BlendQueryPropertyGroup)
     bpy.utils.register_class(BlendQueryImportDependenciesOperator)
     bpy.utils.register_class(BlendQueryInstallOperator)
     bpy.utils.register_class(BlendQueryRegenerateOperator)
+    bpy.utils.register_class(BlendQueryFullMeshOperator)
     bpy.utils.register_class(BlendQueryPanel)
     bpy.utils.register_class(BlendQueryWindowPropertyGroup)
     bpy.types.WindowManager.blendquery = bpy.props.PointerProperty(
@@ -56,6 +72,10 @@ def register():
     )
 
     bpy.app.handlers.load_post.append(initialise)
+    bpy.app.handlers.undo_post.append(reset_mesh_registry)
+    bpy.app.handlers.redo_post.append(reset_mesh_registry)
+    bpy.app.handlers.depsgraph_update_post.append(build_shown_objects)
+    bpy.app.handlers.render_init.append(build_rendered_objects)
     bpy.types.STATUSBAR_HT_header.append(statusbar_progress_bar)
 
 
@@ -63,31 +83,75 @@ def unregister():
     try:
         bpy.types.STATUSBAR_HT_header.remove(statusbar_progress_bar)
         bpy.app.handlers.load_post.remove(initialise)
+        bpy.app.handlers.undo_post.remove(reset_mesh_registry)
+        bpy.app.handlers.redo_post.remove(reset_mesh_registry)
+        bpy.app.handlers.depsgraph_update_post.remove(build_shown_objects)
+        bpy.app.handlers.render_init.remove(build_rendered_objects)
     except:
         pass
+
+    worker.shutdown()
     
     del bpy.types.Object.blendquery
     del bpy.types.WindowManager.blendquery
     bpy.utils.unregister_class(BlendQueryPanel)
     bpy.utils.unregister_class(BlendQueryWindowPropertyGroup)
+    bpy.utils.unregister_class(BlendQueryFullMeshOperator)
     bpy.utils.unregister_class(BlendQueryRegenerateOperator)
     bpy.utils.unregister_class(BlendQueryInstallOperator)
     bpy.utils.unregister_class(BlendQueryImportDependenciesOperator)
     bpy.utils.unregister_class(BlendQueryPropertyGroup)
+    bpy.utils.unregister_class(ParameterPropertyGroup)
     bpy.utils.unregister_class(ObjectPropertyGroup)
+    bpy.utils.unregister_class(BlendQueryPreferences)
 
 
 @persistent
 def initialise(_=None):
-    bpy.ops.blendquery.import_dependencies()
-    if not are_dependencies_installed:
-        return
+    mesh_registry.reset()
+    # Objects are built once the background check finds the dependencies, rather than blocking the file from opening
+    dependency_check.start()
+    if not bpy.app.timers.is_registered(poll_dependency_check):
+        bpy.app.timers.register(poll_dependency_check, first_interval=DEPENDENCY_POLL_S)
+
+
+@persistent
+def reset_mesh_registry(*_):
+    # Undo and redo replace every datablock, so the shared meshes are found again from their tags
+    mesh_registry.reset()
+
+
+def poll_dependency_check():
+    if not dependency_check.done.is_set():
+        return DEPENDENCY_POLL_S
+
+    windows = bpy.context.window_manager.windows
+    if bpy.context.window is None and len(windows) > 0:
+        # Timers run without a window, which the operator needs to report through
+        with bpy.context.temp_override(window=windows[0]):
+            bpy.ops.blendquery.import_dependencies()
+    else:
+        bpy.ops.blendquery.import_dependencies()
+    redraw_properties_areas()
+    if are_dependencies_installed:
+        build_all()
+    return None
+
+
+def build_all():
+    # Start warming the worker while the Blender side is still busy loading
+    configure_worker()
+    worker.start()
+    remove_stale_buffers()
+    remove_stale_buffers(tessellation_cache.directory)
     
     # TODO: find a cleaner solution than this
     # as `update_object` may delete objects from `bpy.data.objects` to perform cleanup, iterate on a copy of it instead to avoid crashes due to `EXCEPTION_ACCESS_VIOLATION`
     objects = []
     for object in bpy.data.objects:
         objects.append(object)
+    # Submit builds in priority order so that the worker pool starts on the active and selected objects first
+    objects.sort(key=lambda object: build_priority(bpy.context, object))
     for object in objects:
         update(object)
 
@@ -107,10 +171,7 @@ def update(object):
             from debounce import debounce
 
             def invoke_update_operator():
-                context_override = bpy.context.copy()
-                context_override["active_object"] = object
-                with bpy.context.temp_override(**context_override):
-                    bpy.ops.blendquery.regenerate()
+                regenerate(object)
 
             invoke_update_operator()
             disposers[object] = watch_for_text_changes(
@@ -123,18 +184,274 @@ def update(object):
             disposer()
 
 
+# Disposers of the watchers on each object's helper modules, by object and then by text name or file path
+helper_disposers = {}
+
+
+def project_paths():
+    # Helper modules may also be files next to the .blend, once it has been saved somewhere
+    return [bpy.path.abspath("//")] if bpy.data.filepath else []
+
+
+def read_text(name: str):
+    text = bpy.data.texts.get(name)
+    return text.as_string() if text is not None else None
+
+
+def watch_helpers(object, helpers: dict):
+    # Regenerates the object whenever a helper it imports changes, and stops watching helpers it no longer imports
+    from debounce import debounce
+
+    watched = helper_disposers.setdefault(object, {})
+    origins = {origin for origin, _ in helpers.values()} if object.blendquery.reload else set()
+    for origin in set(watched) - origins - {None}:
+        watched.pop(origin)()
+    if None not in watched:
+        # One callback per object, so that several helpers changing together regenerate it once
+        watched[None] = debounce(RELOAD_DEBOUNCE_S)(lambda: regenerate(object))
+    for origin in origins - set(watched):
+        if os.path.isabs(origin):
+            watched[origin] = watch_for_file_changes(origin, watched[None])
+        else:
+            watched[origin] = watch_for_text_changes(bpy.data.texts[origin], watched[None])
+
+
+def regenerate(object, force: bool = False):
+    # Objects nobody can see are only marked out of date, and built once they are shown or rendered (which passes `force`)
+    if not force and not is_needed(object):
+        stale_objects.add(object.session_uid)
+        return
+    context_override = bpy.context.copy()
+    context_override["active_object"] = object
+    with bpy.context.temp_override(**context_override):
+        bpy.ops.blendquery.regenerate()
+
+
+# Objects (by `session_uid`) whose builds were deferred while they were hidden or excluded from the view layer
+stale_objects = set()
+
+
+def view_layers():
+    # The view layer shown in each window, as several windows may show different scenes or layers
+    layers = [window.view_layer for window in bpy.context.window_manager.windows]
+    return layers or [bpy.context.view_layer]
+
+
+def generated_objects(object):
+    # The BlendQuery object and everything generated from it; the former is often an empty that is hidden while its geometry is shown
+    return [object] + [pointer.object for pointer in object.blendquery.object_pointers if pointer.object is not None]
+
+
+def is_renderable(object, view_layer) -> bool:
+    # Excluded collections leave their objects out of the view layer entirely
+    return any(
+        not generated.hide_render and generated.name in view_layer.objects
+        for generated in generated_objects(object)
+    )
+
+
+def is_needed(object) -> bool:
+    if bpy.app.background:
+        # Background Blender only runs to render or export, which needs everything that is rendered, visible or not
+        return is_renderable(object, bpy.context.view_layer)
+    return any(
+        generated.visible_get(view_layer=view_layer)
+        for generated in generated_objects(object)
+        for view_layer in view_layers()
+    )
+
+
+def build_stale_objects(needed):
+    # Starts the deferred builds of every stale object for which `needed(object)` holds, most important first
+    objects = [object for object in bpy.data.objects if object.session_uid in stale_objects]
+    # Forget objects which have since been deleted
+    stale_objects.intersection_update(object.session_uid for object in objects)
+    objects.sort(key=lambda object: build_priority(bpy.context, object))
+    for object in objects:
+        if needed(object):
+            # `needed` may be looser than `is_needed`, e.g. renderable but hidden in the viewport
+            regenerate(object, force=True)
+    return None
+
+
+@persistent
+def build_shown_objects(*_):
+    # Hiding, showing or excluding anything updates the depsgraph. Kept cheap, as this runs after every edit in the scene,
+    # and the builds are started from a timer rather than from within the depsgraph update.
+    if stale_objects and not bpy.app.timers.is_registered(build_visible_objects):
+        bpy.app.timers.register(build_visible_objects, first_interval=0.0)
+
+
+def build_visible_objects():
+    return build_stale_objects(is_needed)
+
+
+@persistent
+def build_rendered_objects(*_):
+    # Builds run alongside Blender rather than within the render, so objects shown only in renders appear from the next one on
+    if stale_objects:
+        bpy.app.timers.register(
+            lambda: build_stale_objects(lambda object: any(is_renderable(object, view_layer) for view_layer in bpy.context.scene.view_layers)),
+            first_interval=0.0,
+        )
+
+
+def configure_worker():
+    preferences = bpy.context.preferences.addons[__name__].preferences
+    tessellation_cache.max_size = preferences.cache_size * 1024 * 1024
+    worker.configure(
+        max_workers=preferences.max_workers,
+        max_memory=preferences.max_memory * 1024 * 1024,
+        cache_size=tessellation_cache.max_size,
+    )
+
+
+class BlendQueryPreferences(bpy.types.AddonPreferences):
+    bl_idname = __name__
+
+    def _update(self, _):
+        configure_worker()
+
+    max_workers: bpy.props.IntProperty(
+        name="Build Workers",
+        description="Maximum number of scripts built at once (0 uses one per CPU core)",
+        default=0,
+        min=0,
+        update=_update,
+    )
+    max_memory: bpy.props.IntProperty(
+        name="Build Memory Limit (MB)",
+        description="Builds are queued while running builds use more than this much memory (0 is unlimited). Only available where the memory use of builds can be measured (Linux, macOS and Windows)",
+        default=0,
+        min=0,
+        update=_update,
+    )
+    cache_size: bpy.props.IntProperty(
+        name="Cache Size (MB)",
+        description="Disk space used to keep previous build results for reuse (0 disables the cache)",
+        default=1024,
+        min=0,
+        update=_update,
+    )
+
+    def draw(self, context):
+        column = self.layout.column()
+        column.prop(self, "max_workers")
+        row = column.row()
+        row.prop(self, "max_memory")
+        if not can_measure_rss():
+            # The limit would silently never apply
+            row.enabled = False
+            column.label(icon="INFO", text="Memory use of builds cannot be measured on this platform, so it cannot be limited")
+        column.prop(self, "cache_size")
+
+
 class ObjectPropertyGroup(bpy.types.PropertyGroup):
     object: bpy.props.PointerProperty(type=bpy.types.Object)
+    # Position of the generated object within the script's object tree
+    key: bpy.props.StringProperty()
+    # `ParametricObjectNode.hash` of the result this object was last generated from
+    hash: bpy.props.StringProperty()
+
+
+# Property of `ParameterPropertyGroup` holding the value of each type of parameter
+PARAMETER_VALUES = {"float": "float_value", "int": "int_value", "bool": "bool_value", "str": "string_value"}
+
+
+class ParameterPropertyGroup(bpy.types.PropertyGroup):
+    # A parameter declared by the script, named after its variable
+    def _update(self, _):
+        regenerate_parameters(self.id_data)
+
+    type: bpy.props.StringProperty()
+    # `repr` of the value the script declares, so that editing it in the script takes precedence over the value set here
+    default: bpy.props.StringProperty()
+    float_value: bpy.props.FloatProperty(name="Value", update=_update)
+    int_value: bpy.props.IntProperty(name="Value", update=_update)
+    bool_value: bpy.props.BoolProperty(name="Value", update=_update)
+    string_value: bpy.props.StringProperty(name="Value", update=_update)
+
+
+def parameter_values(object) -> dict:
+    # Only values changed from the script's own, so that untouched parameters keep the exact literal the script declares
+    values = {}
+    for parameter in object.blendquery.parameters:
+        if parameter.type not in PARAMETER_VALUES:
+            continue
+        value = getattr(parameter, PARAMETER_VALUES[parameter.type])
+        if parameter.type == "float":
+            # Float properties are single precision; the shortest decimal reading back as the same value is the one that was typed in
+            value = float(str(numpy.float32(value)))
+        if repr(value) != parameter.default:
+            values[parameter.name] = value
+    return values
+
+
+def sync_parameters(object, script: str):
+    # Lists the script's parameters on the object, keeping the values already set unless the script changed their type or default
+    properties = object.blendquery.parameters
+    previous = {
+        property.name: (property.type, property.default, getattr(property, PARAMETER_VALUES.get(property.type, ""), None))
+        for property in properties
+    }
+    declared = script_parameters(script)
+    if [(parameter.name, parameter.type, repr(parameter.default)) for parameter in declared] == [
+        (name, type, default) for name, (type, default, _) in previous.items()
+    ]:
+        return
+
+    properties.clear()
+    for parameter in declared:
+        property = properties.add()
+        property.name = parameter.name
+        property.type = parameter.type
+        property.default = repr(parameter.default)
+        type, default, value = previous.get(parameter.name, (None, None, None))
+        # Assigned as ID properties, which does not call `_update` and start another build
+        property[PARAMETER_VALUES[parameter.type]] = value if (type, default) == (parameter.type, property.default) else parameter.default
 
 
 class BlendQueryPropertyGroup(bpy.types.PropertyGroup):
     def _update(self, _):
         update(self.id_data)
 
+    def _regenerate(self, _):
+        # Options changing the result rebuild the object straight away, as if its Regenerate button were pressed
+        if self.script is not None:
+            regenerate(self.id_data, force=True)
+
     script: bpy.props.PointerProperty(
         name="Script", type=bpy.types.Text, update=_update
     )
     reload: bpy.props.BoolProperty(name="Automatic Regeneration", default=True, update=_update)
+    progressive: bpy.props.BoolProperty(
+        name="Progressive Regeneration",
+        description="Show a coarse mesh as soon as the script has run, then replace it with the full resolution mesh",
+        default=False,
+    )
+    wireframe: bpy.props.BoolProperty(
+        name="Wireframe Preview",
+        description="Only draw the edges of each shape, which is much faster than meshing its faces",
+        default=False,
+        update=_regenerate,
+    )
+    incremental: bpy.props.BoolProperty(
+        name="Incremental Evaluation",
+        description="Keep the results of unchanged statements and only run the parts of the script affected by an edit",
+        default=False,
+    )
+    profile: bpy.props.BoolProperty(
+        name="Profile Script",
+        description="Save a cProfile dump of the script's execution for every build, bypassing the cache",
+        default=False,
+    )
+    tessellation_workers: bpy.props.IntProperty(
+        name="Tessellation Workers",
+        description="Number of processes meshing each shape in parallel (0 uses one per CPU core)",
+        default=1,
+        min=0,
+    )
+    parameters: bpy.props.CollectionProperty(type=ParameterPropertyGroup)
     object_pointers: bpy.props.CollectionProperty(type=ObjectPropertyGroup)
 
 
@@ -169,19 +486,12 @@ class BlendQueryImportDependenciesOperator(bpy.types.Operator):
 
     import_error = None
 
+    # Applies the outcome of `dependency_check`; the libraries themselves are only ever imported by the build worker
     def execute(self, context):
         global are_dependencies_installed
-        try:
-            global cadquery, build123d
-            global regenerate_blendquery_object
-            cadquery = importlib.import_module("cadquery")
-            build123d = importlib.import_module("build123d")
-            from .blendquery import regenerate_blendquery_object
-            are_dependencies_installed = True
-        except Exception:
-            are_dependencies_installed = False
-            exception_trace = traceback.format_exc()
-            self.import_error = f"Failed to import BlendQuery dependencies: {exception_trace}"
+        are_dependencies_installed = dependency_check.installed
+        if dependency_check.error is not None:
+            self.import_error = f"Failed to import BlendQuery dependencies: {dependency_check.error}"
 
         # `self.report` does not seem to work within `execute` or `invoke`, so we call it within `modal`
         context.window_manager.modal_handler_add(self)
@@ -199,42 +509,77 @@ class BlendQueryImportDependenciesOperator(bpy.types.Operator):
         return {"FINISHED"}
 
 
-def create_parse_parametric_script_thread(script: str):
-    import threading, subprocess, queue, pickle
-    response = queue.Queue()
-
-    def process():
-        cwd = os.path.dirname(os.path.abspath(__file__))
-        parent_directory = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
-        env = os.environ.copy()
-        env['PATH'] = parent_directory
-        process = subprocess.Popen([sys.executable, 'parse.py'], stdin=subprocess.PIPE, stdout=subprocess.PIPE, cwd=cwd, env=env)
-        process.stdin.write(pickle.dumps(script))
-        process.stdin.close()
+def submit_parse_parametric_script(script: str, options: BuildOptions, priority: int = PRIORITY_DEFAULT, cache_key: str = None, session=None, parameters: dict = None, helpers: dict = None):
+    return worker.submit(script, options, priority, cache_key, session, parameters, helpers)
 
-        assert process.stdout
-        stdout_data = process.stdout.read()
-        process.wait()
 
-        response.put(pickle.loads(stdout_data if stdout_data else b""))
+def build_options(object):
+    return BuildOptions(
+        tessellation_workers=object.blendquery.tessellation_workers or os.cpu_count() or 1,
+        progressive=object.blendquery.progressive,
+        profile=object.blendquery.profile,
+        wireframe=object.blendquery.wireframe,
+        incremental=object.blendquery.incremental,
+    )
 
-        # TODO: Investigate return code issue.
-        # if process.returncode == 0:
-        #     response.put(process.stdout.read().decode('utf-8'))
-        # else:
-        #     exception = process.stdout.read().decode('utf-8')
-        #     error_output = process.stderr.read().decode('utf-8')
-        #     response.put(RuntimeError("Subprocess failed with return code {}; {}; {}".format(process.returncode, error_output, exception)))
 
-    thread = threading.Thread(target=process)
-    thread.start()
-    return thread, response
+def build_priority(context, object):
+    # Build what the user is looking at first, so large files become usable before every object has been regenerated
+    if object == context.view_layer.objects.active:
+        return PRIORITY_ACTIVE
+    try:
+        if object.select_get():
+            return PRIORITY_SELECTED
+    except RuntimeError:
+        # Objects outside the current view layer cannot be queried for selection
+        pass
+    return PRIORITY_DEFAULT
 
 regenerate_operators = []
+# Statistics of the last completed build of each object, by `session_uid`
+build_statistics = {}
+# Objects (by `session_uid`) whose parameters changed while they were building, to be built again once that build finishes
+pending_parameter_builds = set()
+
+def supersede_builds(object):
+    # Cancelling kills the build's worker (or drops it from the queue), and its operator finishes without applying anything
+    for operator in regenerate_operators:
+        if operator.object == object:
+            operator.build.cancel()
+
+def regenerate_parameters(object):
+    # Dragging a slider changes its value many times a second. Rather than superseding the running build (and killing the
+    # session holding the script's state, if it has one), let it finish and then build once more with whatever the values are by then.
+    if any(operator.object == object for operator in regenerate_operators):
+        pending_parameter_builds.add(object.session_uid)
+    else:
+        regenerate(object)
+
+PHASE_LABELS = {
+    "queue": "Queue and start-up",
+    "import": "Library import (once per worker)",
+    "exec": "Script",
+    "preview": "Preview",
+    "tessellate": "Tessellation",
+    "serialize": "Serialisation",
+    "mesh": "Mesh construction",
+    "link": "Scene update",
+}
+
+# Share of a build completed by the time each of its phases starts
+PHASE_PROGRESS = {"exec": 0.0, "preview": 0.05, "tessellate": 0.1, "serialize": 0.95}
+
+def phase_progress(phase: str, completed: int, total: int) -> float:
+    start = PHASE_PROGRESS.get(phase, 0.0)
+    end = min((progress for progress in PHASE_PROGRESS.values() if progress > start), default=1.0)
+    return start + (end - start) * (completed / total if total else 0.0)
 
 def update_regeneration_progress():
     bpy.context.window_manager.blendquery.is_regenerating = len(regenerate_operators) > 0
-    bpy.context.window_manager.blendquery.regeneration_progress = 1 / (len(regenerate_operators) + 1)
+    bpy.context.window_manager.blendquery.regeneration_progress = (
+        sum(operator.progress for operator in regenerate_operators) / len(regenerate_operators)
+        if regenerate_operators else 1.0
+    )
 
 class BlendQueryRegenerateOperator(bpy.types.Operator):
     bl_idname = "blendquery.regenerate"
@@ -244,8 +589,48 @@ class BlendQueryRegenerateOperator(bpy.types.Operator):
     # (self, context) must be present in order to register modal operator in Blender
     def execute(self, context):
         self.object = context.active_object
-        # TODO: kill any existing threads for this `context.active_object`
-        self.thread, self.response = create_parse_parametric_script_thread(self.object.blendquery.script.as_string())
+        stale_objects.discard(self.object.session_uid)
+        script = self.object.blendquery.script.as_string()
+        options = build_options(self.object)
+        sync_parameters(self.object, script)
+        parameters = parameter_values(self.object)
+        helpers = helper_sources(script, read_text, project_paths())
+        watch_helpers(self.object, helpers)
+
+        # Latest edit wins; earlier builds of this object are obsolete, including refinements of a preview already on screen
+        supersede_builds(self.object)
+
+        self.started = time.perf_counter()
+        self.statistics = {"timings": {}}
+
+        key = None
+        # Profiling is about the script, so it must actually run rather than come from the cache
+        if tessellation_cache.max_size > 0 and not options.profile:
+            key = cache_key(script, options, parameters, helpers)
+            cached = tessellation_cache.load(key)
+            if cached is not None:
+                self.statistics["cached"] = True
+                self.apply(cached)
+                self.record_statistics()
+                return {"FINISHED"}
+
+        self.build = submit_parse_parametric_script(
+            script,
+            options,
+            build_priority(context, self.object),
+            key,
+            # `session_uid` is unique for the lifetime of the Blender session, unlike the name which the user may change.
+            # Scripts declaring parameters keep a session too, which re-runs only what depends on a parameter when just its value changed,
+            # and so do scripts importing helpers, so that the helpers stay imported between builds. Any other edit runs the
+            # whole script unless incremental evaluation is on.
+            self.object.session_uid if self.object.blendquery.incremental or len(self.object.blendquery.parameters) > 0 or helpers else None,
+            parameters,
+            helpers,
+        )
+        self.previewed = False
+        self.progress = 0.0
+        # Streamed `(key, node)` pairs not applied yet; objects are applied as they arrive rather than once the whole script is built
+        self.streamed_objects = []
 
         # `self.report` does not seem to work within `execute` or `invoke`, so we call it within `modal`
         regenerate_operators.append(self)
@@ -257,20 +642,68 @@ class BlendQueryRegenerateOperator(bpy.types.Operator):
     
         # (self, context, event) must be present in order to register modal operator in Blender
     def modal(self, context, event):
-        if self.thread.is_alive():
-            return {"PASS_THROUGH"}
-        
-        response = self.response.get()
-        if isinstance(response, Exception):
-            self.report_exception(response)
-        else:
-            regenerate_blendquery_object(response, self.object, self.object.blendquery.object_pointers)
-        
+        if self.build.cancelled:
+            return self.finish(context)
+
+        while not self.build.response.empty():
+            kind, response = self.build.response.get()
+            if isinstance(response, Exception):
+                self.report_exception(response)
+                return self.finish(context)
+
+            if kind == "phase":
+                # Everything before the first event is spent queued, starting the worker and forking the build
+                self.statistics["timings"].setdefault("queue", time.perf_counter() - self.started)
+                self.progress = phase_progress(*response)
+                update_regeneration_progress()
+            elif kind == "statistics":
+                timings = self.statistics["timings"]
+                self.statistics.update(response)
+                self.statistics["timings"] = dict(timings, **response.get("timings", {}))
+            elif kind == "object":
+                self.streamed_objects.append(response)
+            elif kind == "result":
+                self.apply(response)
+                self.record_statistics()
+                return self.finish(context)
+            else:
+                # A coarse preview has been shown; keep waiting for the full resolution result
+                self.apply(response)
+                self.previewed = True
+
+        if self.streamed_objects:
+            # Apply every object received since the last event at once; those applied before are left in place
+            self.apply(self.streamed_objects, partial=True)
+            self.streamed_objects = []
+
+        return {"PASS_THROUGH"}
+
+    def apply(self, parametric_objects, partial: bool = False):
+        timings = regenerate_blendquery_object(parametric_objects, self.object, self.object.blendquery.object_pointers, partial)
+        for phase, seconds in timings.items():
+            self.statistics["timings"][phase] = self.statistics["timings"].get(phase, 0.0) + seconds
+
+    def record_statistics(self):
+        self.statistics["total"] = time.perf_counter() - self.started
+        build_statistics[self.object.session_uid] = self.statistics
+        log_build(dict(self.statistics, object=self.object.name, time=time.time()))
+
+    def finish(self, context):
         regenerate_operators.remove(self)
         update_regeneration_progress()
 
         context.window_manager.event_timer_remove(self.timer)
 
+        # Release whatever will now never be applied, e.g. objects streamed before the build was superseded
+        while not self.build.response.empty():
+            discard(*self.build.response.get())
+        release_buffers([node for _, node in self.streamed_objects])
+
+        if self.object.session_uid in pending_parameter_builds:
+            pending_parameter_builds.discard(self.object.session_uid)
+            object = self.object
+            # Started from a timer rather than from within this operator's own modal handler
+            bpy.app.timers.register(lambda: regenerate_parameters(object), first_interval=0.0)
 
         return {"FINISHED"}
 
@@ -314,7 +747,7 @@ class BlendQueryInstallOperator(bpy.types.Operator):
 
         # TODO: this can probably be moved into `install_dependencies` with the new `venv.py` file
         pip_executable = os.path.join(
-            venv_dir, "Scripts" if os.name == "nt" else "bin", "pip"
+            venv_directory(), "Scripts" if os.name == "nt" else "bin", "pip"
         )
         self.thread = install_dependencies(pip_executable, callback)
 
@@ -347,6 +780,17 @@ class BlendQueryInstallOperator(bpy.types.Operator):
         return {"PASS_THROUGH"}
 
 
+class BlendQueryFullMeshOperator(bpy.types.Operator):
+    bl_idname = "blendquery.full_mesh"
+    bl_label = "BlendQuery Full Mesh"
+    bl_description = "Leave the wireframe preview and regenerate the object with fully meshed faces"
+
+    def execute(self, context):
+        # Regenerates the object through the property's update
+        context.active_object.blendquery.wireframe = False
+        return {"FINISHED"}
+
+
 # TODO: Pull UI components into separate functions
 class BlendQueryPanel(bpy.types.Panel):
     bl_idname = "OBJECT_PT_BLENDQUERY_PANEL"
@@ -359,6 +803,8 @@ class BlendQueryPanel(bpy.types.Panel):
         layout = self.layout
         if are_dependencies_installed:
             self.installed(layout, context)
+        elif not dependency_check.done.is_set():
+            layout.label(icon="TIME", text="Checking BlendQuery dependencies...")
         else:
             self.not_installed(layout, context)
 
@@ -367,10 +813,47 @@ class BlendQueryPanel(bpy.types.Panel):
             object = context.active_object
             column = layout.column()
             column.prop(object.blendquery, "script")
+            if len(object.blendquery.parameters) > 0:
+                parameters = column.box().column(align=True)
+                for parameter in object.blendquery.parameters:
+                    if parameter.type in PARAMETER_VALUES:
+                        parameters.prop(parameter, PARAMETER_VALUES[parameter.type], text=parameter.name)
             column.separator(factor=0.5)
+            column.prop(object.blendquery, "wireframe")
+            column.prop(object.blendquery, "progressive")
+            column.prop(object.blendquery, "incremental")
+            column.prop(object.blendquery, "tessellation_workers")
+            column.prop(object.blendquery, "profile")
             row = column.row()
             row.prop(object.blendquery, "reload")
             row.operator("blendquery.regenerate", text="Regenerate")
+            if object.blendquery.wireframe:
+                column.operator("blendquery.full_mesh", icon="MESH_CUBE", text="Build Full Mesh")
+            if object.session_uid in stale_objects:
+                column.label(icon="HIDE_ON", text="Out of date; builds once shown or rendered")
+            self.statistics(layout, object)
+
+    def statistics(self, layout, object):
+        statistics = build_statistics.get(object.session_uid)
+        if statistics is None:
+            return
+        column = layout.box().column(align=True)
+        column.label(text=f"Last build: {statistics['total']:.2f} s" + (" (cached)" if statistics.get("cached") else ""))
+        timings = statistics["timings"]
+        for phase, label in PHASE_LABELS.items():
+            if phase in timings:
+                column.label(text=f"    {label}: {timings[phase]:.3f} s")
+        if statistics.get("edges"):
+            column.label(text=f"{statistics['objects']} objects, {statistics['vertices']:,} vertices, {statistics['edges']:,} edges")
+        elif "triangles" in statistics:
+            column.label(text=f"{statistics['objects']} objects, {statistics['vertices']:,} vertices, {statistics['triangles']:,} triangles")
+        if statistics.get("peak_rss_bytes"):
+            column.label(text=f"Peak worker memory: {format_bytes(statistics['peak_rss_bytes'])}")
+        if statistics.get("executed_statements") is not None:
+            column.label(text=f"Statements executed: {statistics['executed_statements']}")
+        if statistics.get("profile"):
+            column.label(text=f"Profile: {statistics['profile']}")
+
     def not_installed(self, layout, context):
         box = layout.box()
         box.label(
@@ -399,6 +882,14 @@ def redraw_ui():
     bpy.ops.wm.redraw_timer(type="DRAW_WIN_SWAP", iterations=1)
 
 
+def redraw_properties_areas():
+    # Called from a timer, where there is no context area to redraw
+    for window in bpy.context.window_manager.windows:
+        for area in window.screen.areas:
+            if area.type == "PROPERTIES":
+                area.tag_redraw()
+
+
 def redraw_info_area():
     for area in bpy.context.screen.areas:
         if area.type == "INFO":
@@ -0,0 +1,262 @@
+# Headless batch builds of many parametric scripts, exported as mesh files without opening Blender.
+#
+#   python batch.py parts/ --output build/                          # every script in `parts/` as binary glTF
+#   python batch.py manifest.json --output build/ --format stl --jobs 8 --timeout 120
+#   python batch.py parts/ --output build/ --resume                 # skip scripts already built from the same content and options
+#   python batch.py parts/ --output build/ --blend parts.blend      # also collect the results into a .blend with background Blender
+#
+# A manifest is a JSON list of script paths, or of objects `{"script": path, "name": name, "options": {...}, "parameters": {...}}`
+# where `options` overrides `BuildOptions` fields and `parameters` the script's declared parameters (e.g. `width: float = 20.0`),
+# so that one script can be listed several times for a parameter sweep. Relative paths are resolved from the manifest's directory.
+# Scripts are built by the same worker as the add-on, so each one runs in its own process forked from a warm interpreter.
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+from dataclasses import fields
+
+DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, DIRECTORY)
+
+from cache import cache_key
+from modules import helper_sources
+from export import EXPORTERS, export_nodes
+from interop_types import BuildOptions
+from buffers import release_buffers
+from worker import create_worker, discard
+
+PROGRESS_FILE = "batch.jsonl"
+POLL_INTERVAL_S = 0.05
+DEFAULT_TIMEOUT_S = 300.0
+# Run inside `blender --background`, importing every exported file into a collection of its own
+BLEND_SCRIPT = """
+import sys, json, bpy
+paths, blend = json.loads(sys.argv[sys.argv.index("--") + 1])
+bpy.ops.wm.read_factory_settings(use_empty=True)
+for name, path in paths:
+    collection = bpy.data.collections.new(name)
+    bpy.context.scene.collection.children.link(collection)
+    bpy.context.view_layer.active_layer_collection = bpy.context.view_layer.layer_collection.children[collection.name]
+    bpy.ops.import_scene.gltf(filepath=path)
+bpy.ops.wm.save_as_mainfile(filepath=blend)
+"""
+
+
+class Job:
+    def __init__(self, name: str, path: str, options: BuildOptions, parameters: dict = None):
+        self.name = name
+        self.path = path
+        self.options = options
+        self.parameters = parameters
+        self.helpers = None
+        self.script = None
+        self.key = None
+        self.build = None
+        self.started = None
+        self.statistics = {}
+        # Streamed nodes, whose buffers are links to the result's buffer file
+        self.objects = []
+
+
+def load_jobs(source: str, options: BuildOptions):
+    if os.path.isdir(source):
+        entries = [{"script": os.path.join(source, name)} for name in sorted(os.listdir(source)) if name.endswith(".py")]
+        base = ""
+    else:
+        with open(source) as file:
+            entries = json.load(file)
+        base = os.path.dirname(os.path.abspath(source))
+
+    allowed = {option.name for option in fields(BuildOptions)}
+    jobs = []
+    names = set()
+    for entry in entries:
+        if isinstance(entry, str):
+            entry = {"script": entry}
+        overrides = entry.get("options", {})
+        unknown = set(overrides) - allowed
+        if unknown:
+            raise ValueError(f"Unknown build options for {entry['script']}: {', '.join(sorted(unknown))}")
+        name = base_name = entry.get("name") or os.path.splitext(os.path.basename(entry["script"]))[0]
+        # Output files are named after their job, so two scripts with the same file name must not overwrite each other
+        occurrence = 1
+        while name in names:
+            occurrence += 1
+            name = f"{base_name}-{occurrence}"
+        names.add(name)
+        jobs.append(Job(
+            name,
+            os.path.join(base, entry["script"]),
+            BuildOptions(**dict(vars(options), **overrides)),
+            entry.get("parameters"),
+        ))
+    return jobs
+
+
+def load_progress(path: str) -> dict:
+    # The latest record of each job, so that a resumed batch only rebuilds what failed or changed
+    records = {}
+    try:
+        with open(path) as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A batch killed mid-write leaves a truncated last line
+                    continue
+                records[record["name"]] = record
+    except FileNotFoundError:
+        pass
+    return records
+
+
+def output_path(output: str, job: Job, format: str) -> str:
+    return os.path.join(output, f"{job.name}.{format}")
+
+
+def run_batch(jobs, output: str, format: str, max_workers: int, timeout: float, resume: bool):
+    progress_path = os.path.join(output, PROGRESS_FILE)
+    previous = load_progress(progress_path) if resume else {}
+    records = []
+    pending = []
+    for job in jobs:
+        with open(job.path) as file:
+            job.script = file.read()
+        # Scripts may import other modules from their own directory
+        job.helpers = helper_sources(job.script, lambda name: None, [os.path.dirname(os.path.abspath(job.path))])
+        job.key = cache_key(job.script, job.options, job.parameters, job.helpers) + format
+        record = previous.get(job.name)
+        if record is not None and record["status"] == "ok" and record["key"] == job.key and os.path.exists(record["output"]):
+            records.append(dict(record, status="skipped"))
+        else:
+            pending.append(job)
+
+    worker = create_worker()
+    worker.configure(max_workers=max_workers, max_memory=0, cache_size=0)
+    worker.start()
+    try:
+        with open(progress_path, "a") as progress_file:
+            for job in pending:
+                job.build = worker.submit(job.script, job.options, parameters=job.parameters, helpers=job.helpers)
+            running = list(pending)
+            while running:
+                for job in list(running):
+                    record = poll_job(job, output, format, timeout)
+                    if record is not None:
+                        running.remove(job)
+                        records.append(record)
+                        # Written as each job finishes so that an interrupted batch can resume from where it stopped
+                        progress_file.write(json.dumps(record) + "\n")
+                        progress_file.flush()
+                        print(f"[{len(records)}/{len(jobs)}] {job.name}: {record['status']} ({record['seconds']:.2f} s)", file=sys.stderr)
+                time.sleep(POLL_INTERVAL_S)
+    finally:
+        worker.shutdown()
+    return records
+
+
+def poll_job(job: Job, output: str, format: str, timeout: float):
+    # Returns the job's record once it has finished, failed or run out of time, otherwise `None`
+    record = {"name": job.name, "script": job.path, "key": job.key, "output": output_path(output, job, format)}
+    while not job.build.response.empty():
+        kind, payload = job.build.response.get()
+        if job.started is None:
+            # Everything before the first event is spent queued behind other jobs, which does not count towards the timeout
+            job.started = time.perf_counter()
+        if kind == "statistics":
+            job.statistics = payload
+        elif kind == "object":
+            job.objects.append(payload[1])
+        elif kind == "result":
+            record["seconds"] = time.perf_counter() - job.started
+            if isinstance(payload, Exception):
+                release_buffers(job.objects)
+                return dict(record, status="failed", error=f"{type(payload).__name__}: {payload}")
+            # The streamed nodes are in the same buffer file as the result, so only the result is read, and their links removed
+            export_nodes(record["output"], payload, format)
+            release_buffers(job.objects)
+            return dict(
+                record,
+                status="ok",
+                **{name: job.statistics.get(name) for name in ("objects", "vertices", "triangles", "edges", "timings")},
+            )
+
+    if job.started is not None and time.perf_counter() - job.started > timeout:
+        job.build.cancel()
+        # Whatever was streamed before the build was stopped will never be exported
+        while not job.build.response.empty():
+            discard(*job.build.response.get())
+        release_buffers(job.objects)
+        return dict(record, status="timeout", seconds=time.perf_counter() - job.started)
+    return None
+
+
+def build_blend(records, blend: str, blender: str):
+    paths = [(record["name"], os.path.abspath(record["output"])) for record in records if record["status"] in ("ok", "skipped")]
+    subprocess.run(
+        [blender, "--background", "--factory-startup", "--python-expr", BLEND_SCRIPT, "--", json.dumps([paths, os.path.abspath(blend)])],
+        check=True,
+    )
+
+
+def summarise(records, wall_time: float) -> dict:
+    built = [record for record in records if record["status"] == "ok"]
+    build_time = sum(record["seconds"] for record in built)
+    summary = {status: sum(record["status"] == status for record in records) for status in ("ok", "skipped", "failed", "timeout")}
+    summary.update({
+        "wall_s": wall_time,
+        "jobs_per_s": len(built) / wall_time if wall_time > 0 else None,
+        # Total build time over wall time, i.e. how many builds were effectively running at once
+        "parallelism": build_time / wall_time if wall_time > 0 else None,
+        "triangles": sum(record.get("triangles") or 0 for record in built),
+        "triangles_per_s": sum(record.get("triangles") or 0 for record in built) / wall_time if wall_time > 0 else None,
+    })
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build parametric scripts without Blender and export them as mesh files.")
+    parser.add_argument("source", help="Directory of scripts, or a JSON manifest")
+    parser.add_argument("--output", required=True, help="Directory to write the exported files and the progress log to")
+    parser.add_argument("--format", choices=sorted(EXPORTERS), default="glb", help="Export format")
+    parser.add_argument("--jobs", type=int, default=0, help="Scripts built at once (0 uses one per CPU core)")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT_S, help="Seconds a single script may build for")
+    parser.add_argument("--resume", action="store_true", help="Skip scripts already exported from the same content and options")
+    parser.add_argument("--tolerance", type=float, default=BuildOptions.tolerance, help="Linear tessellation tolerance")
+    parser.add_argument("--angular-tolerance", type=float, default=BuildOptions.angular_tolerance, help="Angular tessellation tolerance")
+    parser.add_argument("--wireframe", action="store_true", help="Only export the edges of each shape")
+    parser.add_argument("--blend", help="Also collect the results into this .blend file (requires `--format glb`)")
+    parser.add_argument("--blender", default="blender", help="Blender executable used for `--blend`")
+    parser.add_argument("--summary", help="Write the throughput summary to this file as JSON")
+    arguments = parser.parse_args()
+
+    if arguments.blend and arguments.format != "glb":
+        parser.error("--blend imports the exported files, which requires --format glb")
+
+    options = BuildOptions(
+        tolerance=arguments.tolerance,
+        angular_tolerance=arguments.angular_tolerance,
+        wireframe=arguments.wireframe,
+        tessellation_workers=1,
+    )
+    jobs = load_jobs(arguments.source, options)
+    os.makedirs(arguments.output, exist_ok=True)
+
+    start = time.perf_counter()
+    records = run_batch(jobs, arguments.output, arguments.format, arguments.jobs, arguments.timeout, arguments.resume)
+    if arguments.blend:
+        build_blend(records, arguments.blend, arguments.blender)
+    summary = summarise(records, time.perf_counter() - start)
+
+    report = json.dumps(summary, indent=2)
+    print(report)
+    if arguments.summary:
+        with open(arguments.summary, "w") as file:
+            file.write(report)
+    return 0 if summary["failed"] == 0 and summary["timeout"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
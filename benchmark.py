@@ -0,0 +1,191 @@
+# Headless benchmark of the build pipeline (import, exec, tessellate, serialize) outside of Blender.
+#
+#   python benchmark.py                                   # run the corpus and print the results as JSON
+#   python benchmark.py --save-baseline baseline.json     # record a baseline
+#   python benchmark.py --baseline baseline.json          # exit with status 1 if anything regressed beyond the threshold
+#
+# Each script runs in its own interpreter so that import time and peak memory are measured from a cold start.
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+CORPUS_DIRECTORY = os.path.join(DIRECTORY, "benchmarks")
+DEFAULT_REPEAT = 3
+DEFAULT_THRESHOLD = 0.2
+# Timings below this difference are treated as noise, however large the relative change
+MIN_TIME_DELTA_S = 0.05
+METRICS = ("import_s", "exec_s", "tessellate_s", "serialize_s", "peak_rss_bytes", "payload_bytes")
+
+
+def corpus(directory: str, filter: str = None):
+    return sorted(
+        os.path.join(directory, name)
+        for name in os.listdir(directory)
+        if name.endswith(".py") and (filter is None or filter in name)
+    )
+
+
+def run_corpus(paths, repeat: int):
+    results = {}
+    for path in paths:
+        name = os.path.splitext(os.path.basename(path))[0]
+        process = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--run-one", path, "--repeat", str(repeat)],
+            stdout=subprocess.PIPE,
+            cwd=DIRECTORY,
+        )
+        if process.returncode != 0:
+            results[name] = {"error": f"exit code {process.returncode}"}
+        else:
+            results[name] = json.loads(process.stdout)
+        print(f"{name}: {format_result(results[name])}", file=sys.stderr)
+    return results
+
+
+def run_one(path: str, repeat: int):
+    # Runs in a child interpreter started by `run_corpus`
+    sys.path.insert(0, DIRECTORY)
+    start = time.perf_counter()
+    import parse
+    parse.import_dependencies()
+    import_s = time.perf_counter() - start
+
+    from buffers import write_buffers, release_buffers
+    from memo import TessellationMemo
+    from protocol import encode_message
+    from profiling import peak_rss
+    from interop_types import BuildOptions
+
+    with open(path) as file:
+        script = file.read()
+    options = BuildOptions()
+
+    timings = {"exec_s": [], "tessellate_s": [], "serialize_s": []}
+    for _ in range(repeat):
+        # Start every repetition cold, otherwise only the first one would measure tessellation
+        parse.tessellation_memo = TessellationMemo()
+
+        start = time.perf_counter()
+        objects = parse.execute_parametric_script(script)
+        timings["exec_s"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        nodes = parse.parse_parametric_objects(objects, options)
+        timings["tessellate_s"].append(time.perf_counter() - start)
+
+        counts = count_nodes(nodes)
+
+        start = time.perf_counter()
+        write_buffers(nodes)
+        frame = encode_message(("result", nodes))
+        timings["serialize_s"].append(time.perf_counter() - start)
+        release_buffers(nodes)
+
+    result = {name: min(values) for name, values in timings.items()}
+    result.update(counts)
+    result["import_s"] = import_s
+    result["payload_bytes"] = counts.pop("buffer_bytes") + len(frame)
+    result["peak_rss_bytes"] = peak_rss()
+    return result
+
+
+def count_nodes(nodes):
+    counts = {"objects": 0, "vertices": 0, "triangles": 0, "buffer_bytes": 0}
+    written = set()
+
+    def visit(nodes):
+        for node in nodes:
+            counts["objects"] += 1
+            if node.vertices is not None:
+                counts["vertices"] += len(node.vertices) // 3
+                counts["triangles"] += len(node.faces) // 3
+                # Instances share their arrays, which are only sent once
+                for array in (node.vertices, node.faces):
+                    if id(array) not in written:
+                        written.add(id(array))
+                        counts["buffer_bytes"] += array.nbytes
+            visit(node.children)
+
+    visit(nodes)
+    return counts
+
+
+def compare(results, baseline, threshold: float):
+    regressions = []
+    for name, result in results.items():
+        if "error" in result:
+            regressions.append(f"{name}: {result['error']}")
+            continue
+        expected = baseline.get(name)
+        if expected is None or "error" in expected:
+            continue
+        for metric in METRICS:
+            value, expected_value = result.get(metric), expected.get(metric)
+            if value is None or not expected_value:
+                continue
+            if metric.endswith("_s") and value - expected_value < MIN_TIME_DELTA_S:
+                continue
+            if value > expected_value * (1 + threshold):
+                regressions.append(f"{name}: {metric} {expected_value:.4g} -> {value:.4g} (+{value / expected_value - 1:.0%})")
+        if (result.get("triangles"), result.get("vertices")) != (expected.get("triangles"), expected.get("vertices")):
+            # Not slower, but the output changed, which makes every other comparison meaningless
+            regressions.append(f"{name}: mesh changed from {expected.get('triangles')} to {result.get('triangles')} triangles")
+    return regressions
+
+
+def format_result(result):
+    if "error" in result:
+        return result["error"]
+    return ", ".join(
+        f"{metric}={result[metric]:.3f}" if isinstance(result[metric], float) else f"{metric}={result[metric]}"
+        for metric in result
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the BlendQuery build pipeline without Blender.")
+    parser.add_argument("--corpus", default=CORPUS_DIRECTORY, help="Directory of scripts to benchmark")
+    parser.add_argument("--filter", help="Only run scripts whose file name contains this")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="Repetitions per script; the fastest is reported")
+    parser.add_argument("--output", help="Write the results to this file instead of standard output")
+    parser.add_argument("--baseline", help="Compare against results previously saved with `--save-baseline`")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Relative slow down allowed before failing")
+    parser.add_argument("--save-baseline", help="Save the results as a baseline for later comparison")
+    parser.add_argument("--run-one", help=argparse.SUPPRESS)
+    arguments = parser.parse_args()
+
+    if arguments.run_one:
+        # Keep `print` calls from the benchmarked scripts out of the results
+        output = os.fdopen(os.dup(sys.stdout.fileno()), "w")
+        sys.stdout = sys.stderr
+        json.dump(run_one(arguments.run_one, arguments.repeat), output)
+        output.close()
+        return 0
+
+    results = run_corpus(corpus(arguments.corpus, arguments.filter), arguments.repeat)
+    report = json.dumps(results, indent=2)
+    if arguments.output:
+        with open(arguments.output, "w") as file:
+            file.write(report)
+    else:
+        print(report)
+
+    if arguments.save_baseline:
+        with open(arguments.save_baseline, "w") as file:
+            file.write(report)
+
+    if arguments.baseline:
+        with open(arguments.baseline) as file:
+            regressions = compare(results, json.load(file), arguments.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,17 @@
+# 1000 part assembly of a single repeated fastener, exercising node count, pickling and instancing
+from build123d import *
+
+with BuildPart() as _bolt:
+    Cylinder(radius=2, height=10)
+    with Locations((0, 0, 6.5)):
+        Cylinder(radius=3.5, height=3)
+    chamfer(_bolt.edges().group_by(Axis.Z)[-1], length=0.5)
+
+_bolts = []
+for index in range(1000):
+    bolt = _bolt.part.moved(Location((index % 40 * 10, index // 40 * 10, 0)))
+    bolt.label = f"bolt_{index}"
+    _bolts.append(bolt)
+
+assembly = Compound(label="assembly", children=_bolts)
+del bolt
@@ -0,0 +1,9 @@
+# Small single part with many curved faces, dominated by tessellation
+from build123d import *
+
+with BuildPart() as knob:
+    Cylinder(radius=20, height=15)
+    fillet(knob.edges().group_by(Axis.Z)[-1], radius=3)
+    Hole(radius=3)
+    with PolarLocations(20, 24):
+        Cylinder(radius=1.5, height=15, mode=Mode.SUBTRACT)
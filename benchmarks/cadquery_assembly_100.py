@@ -0,0 +1,13 @@
+# 100 part assembly sharing a few distinct geometries, exercising assembly parsing and instancing
+import cadquery as cq
+
+assembly = cq.Assembly(cq.Workplane("XY").box(200, 200, 5), name="plate")
+for row in range(10):
+    for column in range(10):
+        size = 4 + (row * 10 + column) % 7
+        block = cq.Workplane("XY").box(size, size, size).edges().fillet(size / 8)
+        assembly.add(
+            block,
+            name=f"block_{row}_{column}",
+            loc=cq.Location(cq.Vector(row * 18 - 81, column * 18 - 81, 2.5 + size / 2)),
+        )
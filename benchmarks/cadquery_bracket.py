@@ -0,0 +1,14 @@
+# Small single part: a handful of faces, dominated by script execution
+import cadquery as cq
+
+bracket = (
+    cq.Workplane("XY")
+    .box(80, 60, 10)
+    .faces(">Z")
+    .workplane()
+    .rect(60, 40, forConstruction=True)
+    .vertices()
+    .cboreHole(6, 10, 4)
+    .edges("|Z")
+    .fillet(4)
+)
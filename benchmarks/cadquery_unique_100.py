@@ -0,0 +1,16 @@
+# 100 distinct parts with no shared geometry, so every part is tessellated and serialised separately
+import cadquery as cq
+
+assembly = cq.Assembly(name="gears")
+for index in range(100):
+    teeth = 8 + index % 24
+    radius = 5 + index * 0.1
+    gear = (
+        cq.Workplane("XY")
+        .polygon(teeth * 2, radius * 2)
+        .extrude(3 + index * 0.01)
+        .faces(">Z")
+        .workplane()
+        .hole(radius / 3)
+    )
+    assembly.add(gear, name=f"gear_{index}", loc=cq.Location(cq.Vector(index % 10 * 30, index // 10 * 30, 0)))
@@ -1,51 +1,58 @@
-from typing import Union, List, Tuple
-from dataclasses import dataclass, field
+from typing import Union, List
 
+import time
 import bpy
-import cadquery
-import build123d
-
-ParametricShape = Union[cadquery.Shape, build123d.Shape]
-ParametricObject = Union[
-    ParametricShape,
-    cadquery.Workplane,
-    cadquery.Assembly,
-    build123d.Builder,
-]
-
-@dataclass
-class ParametricObjectNode:
-    name: str
-    material: Union[str, None] = None
-    children: List['ParametricObjectNode'] = field(default_factory=list)
-    vertices: List[Tuple[float, float, float]] = field(default_factory=list)
-    faces: List[Tuple[int, int, int]] = field(default_factory=list)
-
-class BlendQueryBuildException(Exception):
-    def __init__(self, message):
-        super().__init__(message)
-
-def regenerate_blendquery_object(parametric_objects: List[ParametricObject], root_blender_object: bpy.types.Object, old_blender_objects):
+import numpy
+from mathutils import Matrix
+
+# Only ever handles built results, so neither CadQuery nor Build123d (and the seconds it takes to import OCP) are needed here
+from buffers import BufferReader, release_buffers
+from interop_types import MeshBuffer, ParametricObjectNode, node_keys
+
+# Custom property recording which `ParametricObjectNode.geometry` a generated mesh holds
+GEOMETRY_PROPERTY = "blendquery_geometry"
+
+def regenerate_blendquery_object(parametric_objects: List[ParametricObjectNode], root_blender_object: bpy.types.Object, old_blender_objects, partial: bool = False):
+    # `partial` applies streamed nodes, given as `(key, node)` pairs, at any depth of the tree and in tree order, so that a node's
+    # parent is always applied before it. Objects the build has not reached yet, including siblings of those applied, are left in place.
+    # Returns the seconds spent building meshes and updating the scene.
+    start = time.perf_counter()
     # Store current selection
     active = bpy.context.view_layer.objects.active
     selected_objects = bpy.context.selected_objects.copy()
 
-    # Clean up previously generated objects
-    delete_blender_objects(old_blender_objects)
-
-    new_blender_objects = []
-
-    for parametric_object in parametric_objects:
-        new_blender_objects.append(build_blender_object(parametric_object, root_blender_object))
+    keyed_objects = parametric_objects if partial else list(node_keys(parametric_objects, ""))
+    reconciler = Reconciler(old_blender_objects)
+    try:
+        for key, parametric_object in keyed_objects:
+            reconciler.reconcile(parametric_object, key, reconciler.parent(key, root_blender_object))
+    finally:
+        reconciler.reader.close()
+        release_buffers([parametric_object for _, parametric_object in keyed_objects])
 
-    new_blender_objects = flatten_list(new_blender_objects)
+    mesh_time = reconciler.mesh_time
+    # Clean up previously generated objects which are no longer generated
+    if not partial:
+        delete_blender_objects([blender_object for blender_object, _ in reconciler.existing_blender_objects.values()])
+    remove_orphan_meshes(reconciler.replaced_meshes)
 
     parent_collection = root_blender_object.users_collection[0]
-    # Link new objects to the scene and add them into the blendquery objects collection
-    for blender_object in new_blender_objects:
-        parent_collection.objects.link(blender_object)
+    old_blender_objects.clear()
+    for key, hash, blender_object, created in reconciler.reconciled_blender_objects:
+        # Link new objects to the scene; kept objects stay wherever the user has moved them
+        if created:
+            parent_collection.objects.link(blender_object)
         property_group = old_blender_objects.add()
         property_group.object = blender_object
+        property_group.key = key
+        property_group.hash = hash or ""
+    if partial:
+        # The final result decides whether these are still generated
+        for key, (blender_object, hash) in reconciler.existing_blender_objects.items():
+            property_group = old_blender_objects.add()
+            property_group.object = blender_object
+            property_group.key = key
+            property_group.hash = hash
 
     # Restore selection
     for selected_object in bpy.context.selected_objects:
@@ -57,51 +64,227 @@ def regenerate_blendquery_object(parametric_objects: List[ParametricObject], roo
     except:
         pass
 
-def delete_blender_objects(blender_objects):
-    for pointer in blender_objects:
-        try:
-            bpy.data.meshes.remove(pointer.object.data)
-            bpy.data.objects.remove(pointer.object, do_unlink=True)
-        except:
-            continue
-    blender_objects.clear()
+    return {"mesh": mesh_time, "link": time.perf_counter() - start - mesh_time}
 
-def build_blender_object(parametric_object: ParametricObjectNode, parent: bpy.types.Object):
+class MeshRegistry:
+    # Generated meshes by `ParametricObjectNode.geometry`, so that instances of the same geometry share one datablock,
+    # whether they belong to the same build, another BlendQuery object or an earlier regeneration.
+    # Blender already counts the users of every mesh, so that count is the reference count: a mesh is removed
+    # (and drops out of the registry) once the last object using it is deleted or pointed at another mesh.
+    def __init__(self):
+        self.meshes = {}
+        self.scanned = False
 
-    mesh = None
+    def get(self, geometry: str) -> Union[bpy.types.Mesh, None]:
+        if not self.scanned:
+            self.scan()
+        mesh = self.meshes.get(geometry)
+        if mesh is not None and not (is_valid(mesh) and mesh.get(GEOMETRY_PROPERTY) == geometry):
+            del self.meshes[geometry]
+            mesh = None
+        return mesh
 
-    if len(parametric_object.vertices) > 0:
-        mesh = bpy.data.meshes.new(parametric_object.name)
-        mesh.from_pydata(parametric_object.vertices, [], parametric_object.faces)
-        mesh.update()
+    def add(self, geometry: str, mesh: bpy.types.Mesh):
+        if self.get(geometry) is None:
+            self.meshes[geometry] = mesh
+
+    def discard(self, mesh: bpy.types.Mesh):
+        geometry = mesh.get(GEOMETRY_PROPERTY)
+        if geometry and self.meshes.get(geometry) == mesh:
+            del self.meshes[geometry]
 
-    blender_object = bpy.data.objects.new(
-        parametric_object.name,
-        mesh,
-    )
+    def scan(self):
+        # Meshes generated before the file was saved are tagged with their geometry, so they can be shared again after reopening it
+        for mesh in bpy.data.meshes:
+            geometry = mesh.get(GEOMETRY_PROPERTY)
+            if geometry:
+                self.meshes.setdefault(geometry, mesh)
+        self.scanned = True
 
-    if mesh is not None:
-        if parametric_object.material is not None:
-            try:
-                material = bpy.data.materials[parametric_object.material]
-                blender_object.data.materials.append(material)
-            except:
-                pass
+    def reset(self):
+        # Loading a file or undoing replaces every datablock, invalidating the meshes held here
+        self.meshes.clear()
+        self.scanned = False
 
-    blender_object.parent = parent
+mesh_registry = MeshRegistry()
 
-    blender_objects = [blender_object]
+class Reconciler:
+    # Matches a freshly built node tree against the objects generated by the previous build
+    def __init__(self, old_blender_objects):
+        # Index previously generated objects by their position in the tree, so that unchanged objects can be kept as they are
+        self.existing_blender_objects = {}
+        for pointer in old_blender_objects:
+            if pointer.object is not None:
+                self.existing_blender_objects[pointer.key] = (pointer.object, pointer.hash)
+        self.reconciled_blender_objects = []
+        # Objects reconciled so far by key, which streamed nodes further down the tree are parented to
+        self.placed_blender_objects = {}
+        self.reader = BufferReader()
+        self.mesh_time = 0.0
+        # Materials by name, looked up once per build however many meshes use them
+        self.materials = {}
+        # Meshes which objects were pointed away from, removed together once nothing uses them
+        self.replaced_meshes = []
 
-    for child in parametric_object.children:
-        blender_objects.append(build_blender_object(child, blender_object))
+    def parent(self, key: str, root_blender_object: bpy.types.Object) -> bpy.types.Object:
+        parent_key = key.rsplit("/", 1)[0]
+        if not parent_key:
+            return root_blender_object
+        if parent_key in self.placed_blender_objects:
+            return self.placed_blender_objects[parent_key]
+        # Applied by an earlier partial build of the same result, and left in place since
+        existing = self.existing_blender_objects.get(parent_key)
+        return existing[0] if existing is not None else root_blender_object
 
-    return blender_objects
+    def reconcile(self, parametric_object: ParametricObjectNode, key: str, parent: bpy.types.Object):
+        blender_object = None
+        existing = self.existing_blender_objects.pop(key, None)
+        if existing is not None:
+            blender_object, hash = existing
+            if hash == parametric_object.hash and parametric_object.hash:
+                self.keep_mesh(blender_object, parametric_object)
+            elif not self.update_blender_object(blender_object, parametric_object):
+                # Removed straight away rather than with the rest, so that its replacement can take over its name
+                delete_blender_objects([blender_object])
+                blender_object = None
 
-def flatten_list(nested_list):
-    flattened_list = []
-    for item in nested_list:
-        if isinstance(item, list):
-            flattened_list.extend(flatten_list(item))
+        created = blender_object is None
+        if created:
+            blender_object = self.build_blender_object(parametric_object)
+        if blender_object.parent != parent:
+            blender_object.parent = parent
+
+        self.reconciled_blender_objects.append((key, parametric_object.hash, blender_object, created))
+        self.placed_blender_objects[key] = blender_object
+
+        for child_key, child in node_keys(parametric_object.children, key):
+            self.reconcile(child, child_key, blender_object)
+
+    def build_blender_object(self, parametric_object: ParametricObjectNode):
+        mesh = None
+
+        if has_geometry(parametric_object):
+            mesh = self.acquire_mesh(parametric_object)
+
+        blender_object = bpy.data.objects.new(
+            parametric_object.name,
+            mesh,
+        )
+        apply_matrix(blender_object, parametric_object)
+        return blender_object
+
+    def update_blender_object(self, blender_object: bpy.types.Object, parametric_object: ParametricObjectNode) -> bool:
+        # An empty cannot be given mesh data (nor the other way around), so the caller must rebuild the object instead
+        if (blender_object.data is None) == has_geometry(parametric_object) or blender_object.type not in ("MESH", "EMPTY"):
+            return False
+
+        apply_matrix(blender_object, parametric_object)
+        mesh = blender_object.data
+        if mesh is None or (parametric_object.geometry and mesh.get(GEOMETRY_PROPERTY) == parametric_object.geometry):
+            self.keep_mesh(blender_object, parametric_object)
+        elif mesh.users == 1 and not (parametric_object.geometry and mesh_registry.get(parametric_object.geometry)):
+            # Swap the geometry in place so that the object keeps its identity, modifiers and selection
+            mesh_registry.discard(mesh)
+            self.fill_mesh(mesh, parametric_object)
+            self.keep_mesh(blender_object, parametric_object)
         else:
-            flattened_list.append(item)
-    return flattened_list
+            # The mesh is shared with other instances, which may not have changed, so point this object at another mesh instead
+            blender_object.data = self.acquire_mesh(parametric_object)
+            self.replaced_meshes.append(mesh)
+        return True
+
+    def keep_mesh(self, blender_object: bpy.types.Object, parametric_object: ParametricObjectNode):
+        if blender_object.data is not None and parametric_object.geometry:
+            mesh_registry.add(parametric_object.geometry, blender_object.data)
+
+    def acquire_mesh(self, parametric_object: ParametricObjectNode) -> bpy.types.Mesh:
+        mesh = mesh_registry.get(parametric_object.geometry) if parametric_object.geometry else None
+        if mesh is None:
+            mesh = bpy.data.meshes.new(parametric_object.name)
+            self.fill_mesh(mesh, parametric_object)
+            if parametric_object.geometry:
+                mesh_registry.add(parametric_object.geometry, mesh)
+        return mesh
+
+    def fill_mesh(self, mesh: bpy.types.Mesh, parametric_object: ParametricObjectNode):
+        start = time.perf_counter()
+        fill_mesh(mesh, parametric_object, self.reader, self.material(parametric_object.material))
+        self.mesh_time += time.perf_counter() - start
+
+    def material(self, name: Union[str, None]) -> Union[bpy.types.Material, None]:
+        if name is None:
+            return None
+        if name not in self.materials:
+            self.materials[name] = bpy.data.materials.get(name)
+        return self.materials[name]
+
+def delete_blender_objects(blender_objects: List[bpy.types.Object]):
+    # The user may already have deleted some of them
+    blender_objects = [blender_object for blender_object in blender_objects if is_valid(blender_object)]
+    meshes = [blender_object.data for blender_object in blender_objects if isinstance(blender_object.data, bpy.types.Mesh)]
+    if blender_objects:
+        # One call rather than one per object, each of which would otherwise rescan every datablock for users
+        bpy.data.batch_remove(blender_objects)
+    remove_orphan_meshes(meshes)
+
+def remove_orphan_meshes(meshes: List[bpy.types.Mesh]):
+    orphans = {mesh for mesh in meshes if is_valid(mesh) and mesh.users == 0}
+    if orphans:
+        bpy.data.batch_remove(orphans)
+
+def is_valid(id: bpy.types.ID) -> bool:
+    try:
+        id.name
+        return True
+    except ReferenceError:
+        return False
+
+def apply_matrix(blender_object: bpy.types.Object, parametric_object: ParametricObjectNode):
+    if parametric_object.matrix is None:
+        blender_object.matrix_basis = Matrix.Identity(4)
+    else:
+        matrix = parametric_object.matrix
+        blender_object.matrix_basis = Matrix([matrix[row * 4:row * 4 + 4] for row in range(4)])
+
+def has_geometry(parametric_object: ParametricObjectNode) -> bool:
+    vertices = parametric_object.vertices
+    if isinstance(vertices, MeshBuffer):
+        return vertices.count > 0
+    return vertices is not None and len(vertices) > 0
+
+def fill_mesh(mesh: bpy.types.Mesh, parametric_object: ParametricObjectNode, reader: BufferReader, material: Union[bpy.types.Material, None]):
+    vertices = reader.read(parametric_object.vertices)
+    mesh.clear_geometry()
+
+    if parametric_object.edges is not None:
+        # Wireframe builds have no faces, only the segments of each discretised edge
+        edges = reader.read(parametric_object.edges)
+        mesh.vertices.add(len(vertices) // 3)
+        mesh.vertices.foreach_set("co", vertices)
+        mesh.edges.add(len(edges) // 2)
+        mesh.edges.foreach_set("vertices", edges)
+        mesh.update()
+    else:
+        fill_faces(mesh, vertices, reader.read(parametric_object.faces))
+
+    mesh.materials.clear()
+    if material is not None:
+        mesh.materials.append(material)
+
+    if parametric_object.geometry:
+        mesh[GEOMETRY_PROPERTY] = parametric_object.geometry
+
+def fill_faces(mesh: bpy.types.Mesh, vertices: numpy.ndarray, faces: numpy.ndarray):
+    # Every polygon is a triangle, so the flat buffers map directly onto vertex coordinates and loop vertex indices
+    # and can be copied in bulk, rather than going through Python lists as `from_pydata` does
+    triangle_count = len(faces) // 3
+    mesh.vertices.add(len(vertices) // 3)
+    mesh.vertices.foreach_set("co", vertices)
+    mesh.loops.add(len(faces))
+    mesh.loops.foreach_set("vertex_index", faces)
+    mesh.polygons.add(triangle_count)
+    mesh.polygons.foreach_set("loop_start", numpy.arange(0, len(faces), 3, dtype=numpy.int32))
+    # Blender 4.0 onwards derives polygon sizes from `loop_start`, where `loop_total` is read only
+    if not mesh.polygons.bl_rna.properties["loop_total"].is_readonly:
+        mesh.polygons.foreach_set("loop_total", numpy.full(triangle_count, 3, dtype=numpy.int32))
+    mesh.update(calc_edges=True)
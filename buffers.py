@@ -0,0 +1,201 @@
+import os
+import mmap
+import time
+import secrets
+import tempfile
+from dataclasses import replace
+
+import numpy
+
+from interop_types import MeshBuffer
+
+PREFIX = "blendquery-"
+SUFFIX = ".bin"
+ALIGNMENT = 16
+# Files left behind by a crashed Blender session are removed once they are this old
+STALE_AGE_S = 24 * 60 * 60
+
+
+def buffer_directory() -> str:
+    # Prefer a RAM backed file system so that mapping the buffers never touches the disk
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        return "/dev/shm"
+    return tempfile.gettempdir()
+
+
+def remove_stale_buffers(directory: str = None):
+    # Also run on the cache directory, where links to entries are left behind by streamed objects that were never read
+    directory = directory or buffer_directory()
+    now = time.time()
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return
+    for name in names:
+        if name.startswith(PREFIX) and name.endswith(SUFFIX):
+            path = os.path.join(directory, name)
+            try:
+                if now - os.path.getmtime(path) > STALE_AGE_S:
+                    os.remove(path)
+            except OSError:
+                pass
+
+
+def is_transient(path: str) -> bool:
+    # Only files written for a single result (or links made for one) may be removed once read; cache entries outlive the result
+    name = os.path.basename(path)
+    return name.startswith(PREFIX) and name.endswith(SUFFIX)
+
+
+class BufferWriter:
+    # Writes mesh arrays into a single temporary file so that they travel outside of the pickled message stream
+    def __init__(self, directory: str = None):
+        fd, self.path = tempfile.mkstemp(prefix=PREFIX, suffix=SUFFIX, dir=directory or buffer_directory())
+        self.file = os.fdopen(fd, "wb")
+        self.offset = 0
+        # Instances share their arrays, so each array is written (and its descriptor pickled) only once
+        self.written = {}
+
+    def write(self, array: numpy.ndarray) -> MeshBuffer:
+        array = numpy.ascontiguousarray(array)
+        padding = -self.offset % ALIGNMENT
+        if padding:
+            self.file.write(b"\0" * padding)
+            self.offset += padding
+        buffer = MeshBuffer(
+            path=self.path,
+            offset=self.offset,
+            dtype=array.dtype.str,
+            count=array.size,
+        )
+        self.file.write(memoryview(array).cast("B"))
+        self.offset += array.nbytes
+        return buffer
+
+    def write_shared(self, array: numpy.ndarray) -> MeshBuffer:
+        written = self.written.get(id(array))
+        if written is None:
+            # Keep the array alive alongside its descriptor so that its `id` cannot be reused by another array
+            written = self.written[id(array)] = (array, self.write(array))
+        return written[1]
+
+    def write_nodes(self, nodes):
+        for node in nodes:
+            if isinstance(node.vertices, numpy.ndarray):
+                node.vertices = self.write_shared(node.vertices)
+            if isinstance(node.faces, numpy.ndarray):
+                node.faces = self.write_shared(node.faces)
+            if isinstance(node.edges, numpy.ndarray):
+                node.edges = self.write_shared(node.edges)
+            self.write_nodes(node.children)
+
+    def link(self) -> str:
+        # Another name for everything written so far, which a reader can map (and remove, being transient) while writing carries on
+        self.file.flush()
+        while True:
+            path = os.path.join(os.path.dirname(self.path), f"{PREFIX}{secrets.token_hex(8)}{SUFFIX}")
+            try:
+                os.link(self.path, path)
+                return path
+            except FileExistsError:
+                continue
+
+    def discard(self):
+        # Gives up on the file, e.g. because the build writing it failed; readers already holding links to it keep their data
+        self.file.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def close(self):
+        self.file.close()
+        # Nothing was written, so there is nothing for Blender to map
+        if self.offset == 0:
+            os.remove(self.path)
+
+
+def copy_nodes(nodes, path: str = None):
+    # Copies the tree but not the arrays, so that the copy can be written out without touching the original nodes.
+    # With a `path`, buffers are copied too and point at that file instead.
+    def copy_buffer(buffer):
+        return replace(buffer, path=path) if path is not None and isinstance(buffer, MeshBuffer) else buffer
+
+    return [
+        replace(
+            node,
+            vertices=copy_buffer(node.vertices),
+            faces=copy_buffer(node.faces),
+            edges=copy_buffer(node.edges),
+            children=copy_nodes(node.children, path),
+        )
+        for node in nodes
+    ]
+
+
+def write_buffers(nodes):
+    writer = BufferWriter()
+    try:
+        writer.write_nodes(nodes)
+    finally:
+        writer.close()
+    return nodes
+
+
+class BufferReader:
+    # Maps the files written by `BufferWriter` and exposes their arrays without copying them
+    def __init__(self):
+        self.maps = {}
+
+    def read(self, buffer) -> numpy.ndarray:
+        if not isinstance(buffer, MeshBuffer):
+            return numpy.asarray(buffer)
+        if buffer.count == 0:
+            return numpy.empty(0, dtype=buffer.dtype)
+        mapping = self.maps.get(buffer.path)
+        if mapping is None:
+            with open(buffer.path, "rb") as file:
+                mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.maps[buffer.path] = mapping
+        return numpy.frombuffer(mapping, dtype=buffer.dtype, count=buffer.count, offset=buffer.offset)
+
+    def close(self):
+        for path, mapping in self.maps.items():
+            try:
+                mapping.close()
+            except BufferError:
+                # An array still references the mapping; it will be released once that array is collected
+                pass
+            if is_transient(path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        self.maps.clear()
+
+
+def buffer_paths(nodes) -> set:
+    paths = set()
+    for node in nodes:
+        for buffer in (node.vertices, node.faces, node.edges):
+            if isinstance(buffer, MeshBuffer):
+                paths.add(buffer.path)
+        paths |= buffer_paths(node.children)
+    return paths
+
+
+def release_buffers(nodes):
+    # Removes the files behind a result that will never be built, e.g. because a newer build superseded it
+    for path in filter(is_transient, buffer_paths(nodes)):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def relocate_buffers(nodes, path: str):
+    for node in nodes:
+        for buffer in (node.vertices, node.faces, node.edges):
+            if isinstance(buffer, MeshBuffer):
+                buffer.path = path
+        relocate_buffers(node.children, path)
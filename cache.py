@@ -0,0 +1,121 @@
+import os
+import pickle
+import struct
+import hashlib
+import functools
+from dataclasses import fields
+
+from buffers import BufferWriter, relocate_buffers
+from interop_types import BuildOptions
+from modules import helpers_hash
+from setup_venv import blendquery_directory
+
+# Entries are laid out as `[mesh arrays][pickled node tree][footer]` so that the arrays can be mapped in place
+MAGIC = b"BQCACHE1"
+FOOTER = struct.Struct("<8sQQ")
+SUFFIX = ".bqc"
+DEFAULT_MAX_SIZE = 1024 * 1024 * 1024
+LIBRARIES = ("cadquery", "build123d", "cadquery-ocp")
+
+
+@functools.lru_cache(maxsize=None)
+def library_versions():
+    # Read from package metadata so that Blender can compute cache keys without importing OCP
+    from importlib import metadata
+
+    versions = []
+    for library in LIBRARIES:
+        try:
+            versions.append(metadata.version(library))
+        except metadata.PackageNotFoundError:
+            versions.append(None)
+    return tuple(versions)
+
+
+def cache_key(script: str, options: BuildOptions, parameters: dict = None, helpers: dict = None) -> str:
+    digest = hashlib.blake2b(digest_size=20)
+    # Only options which affect the result take part in the key
+    settings = tuple(getattr(options, option.name) for option in fields(options) if option.compare)
+    digest.update(repr((settings, library_versions())).encode())
+    if parameters:
+        digest.update(repr(sorted(parameters.items())).encode())
+    if helpers:
+        # The script's own text is unchanged when only a module it imports is edited
+        digest.update(helpers_hash(helpers).encode())
+    digest.update(script.encode())
+    return digest.hexdigest()
+
+
+class TessellationCache:
+    # Content addressed store of build results, evicted least-recently-used first once it exceeds `max_size` bytes
+    def __init__(self, directory: str = None, max_size: int = DEFAULT_MAX_SIZE):
+        self.directory = directory or os.path.join(blendquery_directory(), "cache")
+        self.max_size = max_size
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key + SUFFIX)
+
+    def load(self, key: str):
+        path = self.path(key)
+        try:
+            with open(path, "rb") as file:
+                file.seek(-FOOTER.size, os.SEEK_END)
+                magic, offset, size = FOOTER.unpack(file.read(FOOTER.size))
+                if magic != MAGIC:
+                    return None
+                file.seek(offset)
+                nodes = pickle.loads(file.read(size))
+            # Access time is not reliably updated by every file system, so record recency in the modification time
+            os.utime(path)
+        except (OSError, EOFError, pickle.UnpicklingError, struct.error):
+            return None
+        relocate_buffers(nodes, path)
+        return nodes
+
+    def open_entry(self) -> BufferWriter:
+        # Arrays can be written into an entry as they are produced, before `store` completes it
+        os.makedirs(self.directory, exist_ok=True)
+        return BufferWriter(self.directory)
+
+    def store(self, key: str, nodes, writer: BufferWriter = None):
+        # Arrays already written by `writer` (from `open_entry`) are kept where they are
+        writer = writer or self.open_entry()
+        try:
+            writer.write_nodes(nodes)
+            index = pickle.dumps(nodes, protocol=pickle.HIGHEST_PROTOCOL)
+            writer.file.write(index)
+            writer.file.write(FOOTER.pack(MAGIC, writer.offset, len(index)))
+            writer.file.close()
+            # Concurrent builds of the same script may race to store it; replacing is atomic so either result is valid
+            os.replace(writer.path, self.path(key))
+        except BaseException:
+            writer.discard()
+            raise
+        relocate_buffers(nodes, self.path(key))
+        self.evict(keep=self.path(key))
+        return nodes
+
+    def evict(self, keep: str = None):
+        entries = []
+        try:
+            with os.scandir(self.directory) as iterator:
+                for entry in iterator:
+                    if entry.name.endswith(SUFFIX):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+        except OSError:
+            return
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            # Never evict the entry that was just stored, even if it alone exceeds the limit, as Blender is about to map it
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+                total_size -= size
+            except OSError:
+                # Entries that are still mapped cannot be removed on Windows; try again on the next eviction
+                pass
@@ -0,0 +1,210 @@
+# Optional build daemon shared by every Blender instance (including background render nodes) on this machine.
+#
+#   python daemon.py --max-workers 8 --cache-size 4096
+#
+# Run it with the same Python version as Blender's so that it can use the add-on's virtual environment. While it is
+# running, Blender sends its builds to it over a Unix domain socket instead of starting a build worker of its own, so that
+# every instance shares one set of warm interpreters, one tessellation memo and one cache, and a build requested by
+# several instances at once runs only once. Blender falls back to its own worker whenever the daemon is not running.
+import os
+import sys
+import signal
+import socket
+import argparse
+import itertools
+import selectors
+
+from protocol import MessageBuffer, encode_message
+from worker import daemon_socket_path, discard
+from zygote import Zygote, READ_SIZE
+
+
+class Client:
+    def __init__(self, connection: socket.socket, id: int):
+        self.connection = connection
+        self.id = id
+        self.buffer = MessageBuffer()
+        # Daemon request ids by the client's own request id
+        self.requests = {}
+
+
+class Daemon(Zygote):
+    # A zygote serving several clients, each numbering its builds (and naming its sessions) independently,
+    # so requests are renumbered on the way in and routed back to whichever clients asked for them on the way out
+    def __init__(self, listener: socket.socket, max_workers: int = 0, max_memory: int = 0, cache_size: int = 0):
+        super().__init__(None, None)
+        self.listener = listener
+        self.clients = {}
+        self.client_ids = itertools.count()
+        self.request_ids = itertools.count()
+        # Clients waiting on each build, as `(client, request_id)`; the first receives the build's streamed objects
+        self.routes = {}
+        # Running or queued builds which later identical requests can wait on, by cache key and the other way around
+        self.shared_builds = {}
+        self.shared_keys = {}
+        # The daemon owns the machine's build slots, so its own settings apply rather than those of any one client
+        self.queue.configure(max_workers, max_memory)
+        self.cache_size = cache_size
+
+    def serve(self):
+        self.selector.register(self.listener, selectors.EVENT_READ)
+        while True:
+            for key, _ in self.selector.select():
+                if key.fileobj is self.listener:
+                    self.accept()
+                elif isinstance(key.data, Client):
+                    self.read_client(key.data)
+                else:
+                    self.read_child(key.data)
+
+    def accept(self):
+        connection, _ = self.listener.accept()
+        client = Client(connection, next(self.client_ids))
+        self.clients[connection.fileno()] = client
+        self.selector.register(connection, selectors.EVENT_READ, client)
+
+    def read_client(self, client: Client):
+        try:
+            data = client.connection.recv(READ_SIZE)
+        except OSError:
+            data = b""
+        if not data:
+            self.disconnect(client)
+            return
+        for message in client.buffer.messages(data):
+            self.handle_client(client, message)
+
+    def handle_client(self, client: Client, message):
+        kind, request_id, *payload = message
+        if kind == "build":
+            script, options, priority, cache_key, session, parameters, helpers = payload
+            # Only results stored in the cache can be shared, as they are not removed once the first client has read them
+            shared = cache_key is not None and self.cache_size > 0 and session is None
+            if shared and cache_key in self.shared_builds:
+                daemon_id = self.shared_builds[cache_key]
+                self.routes[daemon_id].append((client, request_id))
+                client.requests[request_id] = daemon_id
+                return
+            daemon_id = next(self.request_ids)
+            self.routes[daemon_id] = [(client, request_id)]
+            client.requests[request_id] = daemon_id
+            if shared:
+                self.shared_builds[cache_key] = daemon_id
+                self.shared_keys[daemon_id] = cache_key
+            # Session keys are only unique within the Blender instance that chose them
+            session = (client.id, session) if session is not None else None
+            self.handle(("build", daemon_id, script, options, priority, cache_key, session, parameters, helpers))
+        elif kind == "cancel":
+            daemon_id = client.requests.pop(request_id, None)
+            if daemon_id is not None:
+                self.leave(client, daemon_id)
+
+    def leave(self, client: Client, daemon_id):
+        # Stops the build once no client is waiting on it any more
+        routes = [route for route in self.routes.get(daemon_id, []) if route[0] is not client]
+        if routes:
+            self.routes[daemon_id] = routes
+            return
+        self.finish(daemon_id)
+        self.handle(("cancel", daemon_id))
+
+    def finish(self, daemon_id):
+        self.routes.pop(daemon_id, None)
+        cache_key = self.shared_keys.pop(daemon_id, None)
+        if cache_key is not None:
+            del self.shared_builds[cache_key]
+
+    def disconnect(self, client: Client):
+        self.selector.unregister(client.connection)
+        del self.clients[client.connection.fileno()]
+        client.connection.close()
+        for daemon_id in client.requests.values():
+            self.leave(client, daemon_id)
+        client.requests.clear()
+        # The client's sessions can never be resumed, as nobody else knows their keys
+        for session, child in list(self.sessions.items()):
+            if session[0] == client.id and not child.busy:
+                del self.sessions[session]
+                self.kill(child)
+
+    def kill(self, child):
+        child.responded = True
+        try:
+            os.kill(child.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    def send(self, message):
+        request_id, kind, payload = message
+        self.forward(None, request_id, kind, payload)
+
+    def forward(self, frame: bytes, request_id, kind: str, payload):
+        routes = self.routes.get(request_id, [])
+        if kind == "result":
+            self.finish(request_id)
+        if not routes:
+            # Every client waiting on it has gone, so nobody will read the buffers behind it
+            discard(kind, payload)
+            return
+        for index, (client, client_request_id) in enumerate(routes):
+            # Streamed objects live in files which the client removes once read, so only one client may have them
+            if index > 0 and kind in ("object", "preview"):
+                continue
+            if kind == "result":
+                client.requests.pop(client_request_id, None)
+            try:
+                client.connection.sendall(encode_message((client_request_id, kind, payload)))
+            except OSError:
+                pass
+
+    def close_connections(self):
+        self.listener.close()
+        for client in self.clients.values():
+            client.connection.close()
+
+
+def listen(path: str) -> socket.socket:
+    if os.path.exists(path):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+            raise SystemExit(f"A build daemon is already listening on {path}.")
+        except (ConnectionRefusedError, FileNotFoundError):
+            # Left behind by a daemon which did not shut down cleanly
+            os.remove(path)
+        finally:
+            probe.close()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path)
+    # Only this user's Blender instances may submit scripts to run
+    os.chmod(path, 0o600)
+    listener.listen()
+    return listener
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build BlendQuery scripts for every Blender instance on this machine.")
+    parser.add_argument("--socket", default=daemon_socket_path(), help="Path of the Unix domain socket to listen on")
+    parser.add_argument("--max-workers", type=int, default=0, help="Scripts built at once (0 uses one per CPU core)")
+    parser.add_argument("--max-memory", type=int, default=0, help="Builds are queued while running builds use more than this many MB (0 is unlimited)")
+    parser.add_argument("--cache-size", type=int, default=1024, help="MB of disk used to share build results between instances (0 disables the cache)")
+    arguments = parser.parse_args()
+
+    listener = listen(arguments.socket)
+    daemon = Daemon(listener, arguments.max_workers, arguments.max_memory * 1024 * 1024, arguments.cache_size * 1024 * 1024)
+    daemon.warm()
+    # Leave through `finally` on `kill` too, so that the socket file does not outlive the daemon
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    print(f"Listening on {arguments.socket}", file=sys.stderr)
+    try:
+        daemon.serve()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        listener.close()
+        os.remove(arguments.socket)
+
+
+if __name__ == "__main__":
+    main()
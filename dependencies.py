@@ -0,0 +1,44 @@
+import threading
+import traceback
+import importlib
+import importlib.util
+
+from setup_venv import setup_venv
+
+# Top-level packages which must be importable by the build worker
+REQUIRED_PACKAGES = ("cadquery", "build123d", "OCP")
+
+
+class DependencyCheck:
+    # Prepares the virtual environment and looks for the libraries on a background thread.
+    # Packages are only located, never imported, as importing OCP takes seconds and only the build worker needs it.
+    def __init__(self):
+        self.thread = None
+        self.done = threading.Event()
+        self.installed = False
+        self.error = None
+
+    def start(self):
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.done.clear()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        try:
+            setup_venv()
+            # Packages installed since the last check would otherwise be hidden by stale finder caches
+            importlib.invalidate_caches()
+            self.installed = all(importlib.util.find_spec(package) is not None for package in REQUIRED_PACKAGES)
+            self.error = None
+            if self.installed:
+                # Cache keys need the library versions; reading their metadata here keeps it off the first regeneration
+                from cache import library_versions
+                library_versions.cache_clear()
+                library_versions()
+        except Exception:
+            self.installed = False
+            self.error = traceback.format_exc()
+        finally:
+            self.done.set()
@@ -0,0 +1,215 @@
+import json
+import struct
+
+import numpy
+
+from buffers import BufferReader
+
+# Binary STL triangle record: normal, three corners and an unused attribute word, packed to 50 bytes
+STL_TRIANGLE = numpy.dtype([("normal", "<f4", (3,)), ("vertices", "<f4", (3, 3)), ("attribute", "<u2")])
+PLY_FACE = numpy.dtype([("count", "u1"), ("indices", "<i4", (3,))])
+
+GLTF_ARRAY_BUFFER = 34962
+GLTF_ELEMENT_ARRAY_BUFFER = 34963
+GLTF_FLOAT = 5126
+GLTF_UNSIGNED_INT = 5125
+GLTF_LINES = 1
+GLTF_TRIANGLES = 4
+# glTF is Y up where CAD (and Blender) is Z up; column-major rotation of -90 degrees about X
+GLTF_Z_UP = [1.0, 0.0, 0.0, 0.0, 0.0, 0.0, -1.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 0.0, 1.0]
+
+
+def node_matrix(node) -> numpy.ndarray:
+    if node.matrix is None:
+        return numpy.identity(4)
+    return numpy.array(node.matrix, dtype=numpy.float64).reshape(4, 4)
+
+
+def flatten(nodes, reader: BufferReader, parent: numpy.ndarray = None):
+    # Yields `(vertices, faces, edges)` for every node with geometry, with its vertices moved into world space
+    parent = numpy.identity(4) if parent is None else parent
+    for node in nodes:
+        matrix = parent @ node_matrix(node)
+        vertices = reader.read(node.vertices).reshape(-1, 3) if node.vertices is not None else None
+        if vertices is not None and len(vertices) > 0:
+            vertices = vertices.astype(numpy.float64) @ matrix[:3, :3].T + matrix[:3, 3]
+            faces = reader.read(node.faces) if node.faces is not None else None
+            edges = reader.read(node.edges) if node.edges is not None else None
+            yield vertices.astype(numpy.float32), faces, edges
+        yield from flatten(node.children, reader, matrix)
+
+
+def merge(nodes, reader: BufferReader):
+    # A single mesh of every instance, for formats which have no notion of a hierarchy
+    vertices, faces, edges = [], [], []
+    offset = 0
+    for part_vertices, part_faces, part_edges in flatten(nodes, reader):
+        vertices.append(part_vertices)
+        if part_faces is not None:
+            faces.append(part_faces + offset)
+        if part_edges is not None:
+            edges.append(part_edges + offset)
+        offset += len(part_vertices)
+
+    def concatenate(arrays, dtype, shape):
+        return numpy.concatenate(arrays).astype(dtype, copy=False) if arrays else numpy.empty(shape, dtype=dtype)
+
+    return (
+        concatenate(vertices, numpy.float32, (0, 3)),
+        concatenate(faces, numpy.int32, 0),
+        concatenate(edges, numpy.int32, 0),
+    )
+
+
+def write_stl(path: str, nodes, reader: BufferReader):
+    # STL only holds triangles, so wireframe results produce an empty file
+    vertices, faces, _ = merge(nodes, reader)
+    triangles = vertices[faces.reshape(-1, 3)]
+    normals = numpy.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    lengths = numpy.linalg.norm(normals, axis=1, keepdims=True)
+    normals = numpy.divide(normals, lengths, out=numpy.zeros_like(normals), where=lengths > 0)
+
+    records = numpy.zeros(len(triangles), dtype=STL_TRIANGLE)
+    records["normal"] = normals
+    records["vertices"] = triangles
+    with open(path, "wb") as file:
+        file.write(b"BlendQuery".ljust(80, b"\0"))
+        file.write(struct.pack("<I", len(records)))
+        file.write(records.tobytes())
+
+
+def write_ply(path: str, nodes, reader: BufferReader):
+    vertices, faces, edges = merge(nodes, reader)
+    triangles = numpy.zeros(len(faces) // 3, dtype=PLY_FACE)
+    triangles["count"] = 3
+    triangles["indices"] = faces.reshape(-1, 3)
+
+    header = [
+        "ply",
+        "format binary_little_endian 1.0",
+        "comment BlendQuery",
+        f"element vertex {len(vertices)}",
+        "property float x",
+        "property float y",
+        "property float z",
+        f"element face {len(triangles)}",
+        "property list uchar int vertex_indices",
+    ]
+    if len(edges) > 0:
+        header += [f"element edge {len(edges) // 2}", "property int vertex1", "property int vertex2"]
+    header.append("end_header")
+
+    with open(path, "wb") as file:
+        file.write(("\n".join(header) + "\n").encode("ascii"))
+        file.write(vertices.astype("<f4").tobytes())
+        file.write(triangles.tobytes())
+        file.write(edges.astype("<i4").tobytes())
+
+
+def write_glb(path: str, nodes, reader: BufferReader):
+    # Binary glTF keeps the object hierarchy, transforms and material names, and stores shared geometry once
+    document = {
+        "asset": {"version": "2.0", "generator": "BlendQuery"},
+        "scene": 0,
+        "scenes": [{"nodes": [0]}],
+        "nodes": [{"name": "root", "matrix": GLTF_Z_UP, "children": []}],
+        "meshes": [],
+        "materials": [],
+        "accessors": [],
+        "bufferViews": [],
+    }
+    binary = bytearray()
+    meshes = {}
+    materials = {}
+
+    def add_accessor(array: numpy.ndarray, target: int, component_type: int, type: str, **bounds) -> int:
+        binary.extend(b"\0" * (-len(binary) % 4))
+        document["bufferViews"].append({"buffer": 0, "byteOffset": len(binary), "byteLength": array.nbytes, "target": target})
+        binary.extend(array.tobytes())
+        document["accessors"].append({
+            "bufferView": len(document["bufferViews"]) - 1,
+            "componentType": component_type,
+            "count": len(array),
+            "type": type,
+            **bounds,
+        })
+        return len(document["accessors"]) - 1
+
+    def add_material(name: str) -> int:
+        if name not in materials:
+            materials[name] = len(document["materials"])
+            document["materials"].append({"name": name})
+        return materials[name]
+
+    def add_mesh(node):
+        key = node.geometry or id(node)
+        if key not in meshes:
+            meshes[key] = None
+            vertices = reader.read(node.vertices).reshape(-1, 3).astype("<f4") if node.vertices is not None else None
+            if vertices is None or len(vertices) == 0:
+                return None
+            if node.edges is not None:
+                indices, mode = reader.read(node.edges), GLTF_LINES
+            else:
+                indices, mode = reader.read(node.faces), GLTF_TRIANGLES
+            if len(indices) == 0:
+                return None
+            primitive = {
+                "attributes": {
+                    "POSITION": add_accessor(
+                        vertices, GLTF_ARRAY_BUFFER, GLTF_FLOAT, "VEC3",
+                        min=vertices.min(axis=0).tolist(), max=vertices.max(axis=0).tolist(),
+                    ),
+                },
+                "indices": add_accessor(indices.astype("<u4"), GLTF_ELEMENT_ARRAY_BUFFER, GLTF_UNSIGNED_INT, "SCALAR"),
+                "mode": mode,
+            }
+            if node.material:
+                primitive["material"] = add_material(node.material)
+            meshes[key] = len(document["meshes"])
+            document["meshes"].append({"name": node.name, "primitives": [primitive]})
+        return meshes[key]
+
+    def add_node(node, parent: dict):
+        entry = {"name": node.name}
+        if node.matrix is not None:
+            entry["matrix"] = node_matrix(node).T.reshape(-1).tolist()
+        mesh = add_mesh(node)
+        if mesh is not None:
+            entry["mesh"] = mesh
+        document["nodes"].append(entry)
+        parent.setdefault("children", []).append(len(document["nodes"]) - 1)
+        for child in node.children:
+            add_node(child, entry)
+
+    for node in nodes:
+        add_node(node, document["nodes"][0])
+    for key in ("meshes", "materials", "accessors", "bufferViews"):
+        if not document[key]:
+            del document[key]
+    if binary:
+        document["buffers"] = [{"byteLength": len(binary)}]
+
+    content = json.dumps(document, separators=(",", ":")).encode()
+    content += b" " * (-len(content) % 4)
+    binary.extend(b"\0" * (-len(binary) % 4))
+    length = 12 + 8 + len(content) + (8 + len(binary) if binary else 0)
+    with open(path, "wb") as file:
+        file.write(struct.pack("<4sII", b"glTF", 2, length))
+        file.write(struct.pack("<I4s", len(content), b"JSON"))
+        file.write(content)
+        if binary:
+            file.write(struct.pack("<I4s", len(binary), b"BIN\0"))
+            file.write(binary)
+
+
+EXPORTERS = {"glb": write_glb, "stl": write_stl, "ply": write_ply}
+
+
+def export_nodes(path: str, nodes, format: str):
+    reader = BufferReader()
+    try:
+        EXPORTERS[format](path, nodes, reader)
+    finally:
+        # Also removes the result's transient buffer files, which nothing else will read
+        reader.close()
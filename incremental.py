@@ -0,0 +1,263 @@
+import gc
+import ast
+import types
+import difflib
+import builtins
+
+from modules import imported_names
+from parameters import apply_parameters
+
+# Calls which read or write names in ways that cannot be seen from the syntax
+DYNAMIC_CALLS = {"exec", "eval", "globals", "locals", "vars", "__import__", "setattr", "delattr"}
+# Values of these types are freely shared by the interpreter, so sharing one is not a sign of mutation
+IMMUTABLE_TYPES = (int, float, complex, bool, str, bytes, type(None))
+# Values of these types belong to the interpreter or to imported libraries rather than to the script's own objects
+OPAQUE_TYPES = (types.ModuleType, type, types.FunctionType, types.BuiltinFunctionType, types.CodeType)
+# Object graphs larger than this are not searched for shared objects, and are assumed to share one
+MAX_REACHABLE_OBJECTS = 1_000_000
+
+
+class StatementRecord:
+    # What one top-level statement did the last time it ran, so that it can be replayed instead of executed
+    def __init__(self, key: str):
+        self.key = key
+        self.reads = set()
+        self.writes = set()
+        self.mutates = set()
+        # The record that provided each read name when this statement ran, or `None` if it was unbound
+        self.sources = {}
+        self.outputs = {}
+        self.deleted = set()
+
+
+class IncrementalFallback(Exception):
+    pass
+
+
+class ScriptSession:
+    # Keeps the result of every top-level statement between runs of the same script, and re-executes only the
+    # statements which changed and those reading anything they write. Objects mutated in place (e.g. `assembly.add(part)`,
+    # or build123d's `move` returning `self`) tie the mutating statement to the one that created the object, so that both
+    # run again together. Scripts whose dependencies cannot be determined are always run in full.
+    def __init__(self):
+        self.records = []
+        # Records produced by statements executed (rather than replayed) during the current run
+        self.executed_records = set()
+        # Ids of every object reachable from the outputs of the records replayed so far during the current run
+        self.replayed_objects = set()
+        # The script, helper versions and parameters of the last run
+        self.last_run = None
+
+    def execute(self, script: str, globals: dict, locals: dict, parameters: dict = None, versions: dict = None, incremental: bool = True):
+        # `versions` are those of the helper modules, so that importing a helper which changed counts as a changed statement.
+        # Without `incremental`, the script runs in full unless only its parameters changed since the last run, as scrubbing a
+        # parameter is meant to only run what depends on it; `apply_parameters` leaves every other statement as it was.
+        last_run, self.last_run = self.last_run, (script, versions, parameters or {})
+        statements = ast.parse(script).body
+        if parameters:
+            statements = apply_parameters(statements, parameters)
+        keys = [statement_key(statement, versions) for statement in statements]
+        parameters_changed = last_run is not None and last_run[:2] == (script, versions) and last_run[2] != self.last_run[2]
+        if any(is_dynamic(statement) for statement in statements) or not (incremental or parameters_changed):
+            return self.execute_full(statements, keys, globals, locals)
+
+        matches = match_records(self.records, keys)
+        try:
+            forced = plan(statements, matches)
+            self.records = self.execute_statements(statements, keys, matches, forced, globals, locals)
+        except IncrementalFallback:
+            # Something replayed was changed by a statement that has to run again; start over from a clean namespace
+            locals.clear()
+            return self.execute_full(statements, keys, globals, locals)
+
+    def execute_full(self, statements, keys, globals: dict, locals: dict):
+        self.records = []
+        self.records = self.execute_statements(statements, keys, [None] * len(statements), set(), globals, locals)
+
+    def execute_statements(self, statements, keys, matches, forced, globals: dict, locals: dict):
+        records = []
+        providers = {}
+        self.executed_records = set()
+        self.replayed_objects = set()
+        try:
+            for index, (statement, key, match) in enumerate(zip(statements, keys, matches)):
+                if match is not None and index not in forced and is_current(match, providers):
+                    # Replay the bindings the statement made last time
+                    locals.update(match.outputs)
+                    for name in match.deleted:
+                        locals.pop(name, None)
+                    reachable_objects(match.outputs.values(), self.replayed_objects)
+                    record = match
+                else:
+                    record = self.execute_statement(statement, key, providers, globals, locals)
+                for name in record.writes | record.mutates:
+                    providers[name] = record
+                records.append(record)
+        except IncrementalFallback:
+            raise
+        except Exception:
+            # A failed run leaves nothing reliable to replay
+            self.records = []
+            raise
+        return records
+
+    def execute_statement(self, statement: ast.stmt, key: str, providers: dict, globals: dict, locals: dict) -> StatementRecord:
+        record = StatementRecord(key)
+        record.reads, targets, mutated = statement_names(statement)
+        record.sources = {name: providers.get(name) for name in record.reads}
+        for name in mutated:
+            # The object is shared with whatever statement created it, which was replayed rather than run again
+            if providers.get(name) is not None and providers[name] not in self.executed_records:
+                raise IncrementalFallback()
+        # An object created again can still hold on to a replayed one, e.g. `holder = Holder(items)` keeping a replayed list,
+        # which mutating it through a call or attribute chain (`holder.items.append(5)`) would change behind the replay's back
+        if mutated and self.replayed_objects:
+            reached = reachable_objects([locals[name] for name in mutated if name in locals])
+            if not reached.isdisjoint(self.replayed_objects):
+                raise IncrementalFallback()
+
+        before = dict(locals)
+        exec(compile(ast.Module(body=[statement], type_ignores=[]), "<string>", "exec"), globals, locals)
+
+        record.writes = targets | {name for name, value in locals.items() if name not in before or before[name] is not value}
+        record.deleted = set(before) - set(locals)
+        record.writes |= record.deleted
+        record.outputs = {name: locals[name] for name in record.writes if name in locals}
+
+        # A written value which was already bound elsewhere (e.g. `part = part.move(location)`) may have been changed in place
+        shared = {id(value): name for name, value in before.items() if not isinstance(value, IMMUTABLE_TYPES)}
+        record.mutates = mutated | {shared[id(value)] for value in record.outputs.values() if id(value) in shared}
+        for name in record.mutates - mutated:
+            if providers.get(name) is not None and providers[name] not in self.executed_records:
+                raise IncrementalFallback()
+
+        self.executed_records.add(record)
+        return record
+
+
+def reachable_objects(values, seen: set = None) -> set:
+    # Ids of every object reachable from `values` that may be changed in place, added to `seen`
+    seen = set() if seen is None else seen
+    pending = list(values)
+    while pending:
+        value = pending.pop()
+        if isinstance(value, IMMUTABLE_TYPES + OPAQUE_TYPES) or id(value) in seen:
+            continue
+        if not isinstance(value, (tuple, frozenset)):
+            # Immutable containers are searched, but sharing one (e.g. a replayed `size = (10, 20)`) is harmless in itself
+            seen.add(id(value))
+            if len(seen) > MAX_REACHABLE_OBJECTS:
+                raise IncrementalFallback()
+        pending.extend(gc.get_referents(value))
+    return seen
+
+
+def statement_key(statement: ast.stmt, versions: dict = None) -> str:
+    # Formatting and comments do not change the key, only the code itself
+    key = ast.dump(statement, annotate_fields=False, include_attributes=False)
+    if versions:
+        key += "".join(versions[name] for name in sorted(imported_names(statement)) if name in versions)
+    return key
+
+
+def is_dynamic(statement: ast.stmt) -> bool:
+    for node in ast.walk(statement):
+        if isinstance(node, (ast.Global, ast.Nonlocal)):
+            return True
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in DYNAMIC_CALLS:
+            return True
+    return False
+
+
+def statement_names(statement: ast.stmt):
+    # Returns the names read, bound and possibly mutated by a statement. Reads include every name loaded anywhere within it,
+    # which over-approximates (e.g. a function's own locals), but only ever causes more to run again, never less.
+    reads, targets, mutated = set(), set(), set()
+    for node in ast.walk(statement):
+        if isinstance(node, ast.Name):
+            if isinstance(node.ctx, ast.Load):
+                reads.add(node.id)
+            else:
+                targets.add(node.id)
+        elif isinstance(node, (ast.Attribute, ast.Subscript)) and not isinstance(node.ctx, ast.Load):
+            # `part.label = "..."` or `parts[0] = ...`
+            root = root_name(node)
+            if root is not None:
+                mutated.add(root)
+        elif isinstance(node, ast.AugAssign) and isinstance(node.target, ast.Name):
+            reads.add(node.target.id)
+            mutated.add(node.target.id)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            targets.add(node.name)
+        elif isinstance(node, ast.alias):
+            if node.name != "*":
+                targets.add((node.asname or node.name).split(".")[0])
+
+    if not isinstance(statement, (ast.Assign, ast.AnnAssign, ast.Import, ast.ImportFrom, ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+        # Outside of a plain binding, a method call or passing a value to a function is how objects are changed in place,
+        # e.g. `assembly.add(part)` or `with BuildPart() as part: add(other.part)`
+        for node in ast.walk(statement):
+            if isinstance(node, ast.Call):
+                if isinstance(node.func, (ast.Attribute, ast.Subscript)):
+                    root = root_name(node.func)
+                    if root is not None:
+                        mutated.add(root)
+                for argument in list(node.args) + [keyword.value for keyword in node.keywords]:
+                    root = root_name(argument)
+                    if root is not None:
+                        mutated.add(root)
+
+    reads -= set(dir(builtins)) - targets
+    mutated -= targets
+    return reads, targets, mutated
+
+
+def root_name(node: ast.AST):
+    while isinstance(node, (ast.Attribute, ast.Subscript, ast.Starred)):
+        node = node.value
+    return node.id if isinstance(node, ast.Name) else None
+
+
+def match_records(records, keys):
+    # Pair each statement with its unchanged counterpart from the previous run, allowing for inserted and removed statements
+    matches = [None] * len(keys)
+    matcher = difflib.SequenceMatcher(None, [record.key for record in records], keys, autojunk=False)
+    for old, new, size in matcher.get_matching_blocks():
+        for offset in range(size):
+            matches[new + offset] = records[old + offset]
+    return matches
+
+
+def is_current(record: StatementRecord, providers: dict) -> bool:
+    # Replaying is only valid if every name the statement read still comes from the same statement as last time
+    return all(providers.get(name) is source for name, source in record.sources.items())
+
+
+def plan(statements, matches):
+    # Find statements which must run again even though they and their inputs are unchanged: those that created an
+    # object which a re-executed statement mutates. Replaying them would hand over an object already changed last time.
+    forced = set()
+    while True:
+        providers = {}
+        index_of = {}
+        required = set()
+        for index, (statement, match) in enumerate(zip(statements, matches)):
+            if match is not None and index not in forced and is_current(match, providers):
+                record = match
+                index_of[id(record)] = index
+            else:
+                _, targets, mutated = statement_names(statement)
+                mutated = mutated | (match.mutates if match is not None else set())
+                for name in mutated:
+                    provider = providers.get(name)
+                    if provider is not None and id(provider) in index_of:
+                        required.add(index_of[id(provider)])
+                # Stands in for the record this statement will produce once executed
+                record = StatementRecord(None)
+                record.writes = targets | (match.writes if match is not None else set())
+                record.mutates = mutated
+            for name in record.writes | record.mutates:
+                providers[name] = record
+        if required <= forced:
+            return forced
+        forced |= required
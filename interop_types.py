@@ -1,13 +1,76 @@
-from typing import Union, List, Tuple
-from dataclasses import dataclass, field
+from typing import Any, Union, List, Tuple
+from dataclasses import dataclass, field, replace
+
+# Coarse previews are tessellated this many times looser than the requested tolerance
+COARSE_TOLERANCE_FACTOR = 10
+COARSE_ANGULAR_TOLERANCE = 0.5
+
+@dataclass(frozen=True)
+class BuildOptions:
+    # Tolerances are a trade off between accuracy and performance
+    # `0.01` is decided from a standard of `1u=1m`
+    tolerance: float = 0.01
+    angular_tolerance: float = 0.01
+    # Vertices closer than this are merged, as faces are meshed separately and repeat the vertices along shared edges (`0` disables welding)
+    weld_tolerance: float = 1e-6
+    # Remove triangles which collapse once their vertices are welded
+    drop_degenerate: bool = True
+    # Only discretise the edges of each shape into polylines, which is much cheaper than meshing its faces
+    wireframe: bool = False
+    # Number of processes reading back the mesh of a single shape; it does not change the result so it is left out of comparisons and cache keys
+    tessellation_workers: int = field(default=1, compare=False)
+    # Send a coarse preview before the full resolution result; the final result is the same either way
+    progressive: bool = field(default=False, compare=False)
+    # Replay the unchanged statements of a session's previous run after any edit, rather than only after a parameter change;
+    # the result is the same either way
+    incremental: bool = field(default=False, compare=False)
+    # Save a cProfile dump of the script's execution alongside the build statistics
+    profile: bool = field(default=False, compare=False)
+
+    def coarse(self) -> 'BuildOptions':
+        return replace(
+            self,
+            tolerance=self.tolerance * COARSE_TOLERANCE_FACTOR,
+            angular_tolerance=max(self.angular_tolerance, COARSE_ANGULAR_TOLERANCE),
+            progressive=False,
+        )
+
+@dataclass
+class MeshBuffer:
+    # A flat array stored in a memory-mappable file rather than inside the pickled message
+    path: str
+    offset: int
+    dtype: str
+    count: int
 
 @dataclass
 class ParametricObjectNode:
     name: str
     material: Union[str, None] = None
     children: List['ParametricObjectNode'] = field(default_factory=list)
-    vertices: List[Tuple[float, float, float]] = field(default_factory=list)
-    faces: List[Tuple[int, int, int]] = field(default_factory=list)
+    # Flat `float32` XYZ coordinates and flat `int32` triangle indices, either as arrays or as `MeshBuffer`s
+    vertices: Any = None
+    faces: Any = None
+    # Flat `int32` vertex index pairs, set instead of `faces` for wireframe builds
+    edges: Any = None
+    # Row-major 4x4 transform relative to the parent, or `None` for the identity
+    matrix: Union[Tuple[float, ...], None] = None
+    # Digest of the material and geometry alone; nodes sharing it are instances of the same mesh
+    geometry: Union[str, None] = None
+    # Digest of the name, material, transform and geometry, used to skip rebuilding Blender objects which have not changed
+    hash: Union[str, None] = None
+
+def node_key(parent_key: str, name: str, occurrences: dict) -> str:
+    # Position of a node within the tree, e.g. `/assembly#0/bolt#3`. Siblings frequently share a name
+    # (e.g. assembly children inherit their parent's), so they are disambiguated by occurrence, counted in `occurrences`.
+    occurrence = occurrences.get(name, 0)
+    occurrences[name] = occurrence + 1
+    return f"{parent_key}/{name}#{occurrence}"
+
+def node_keys(nodes: List[ParametricObjectNode], parent_key: str):
+    occurrences = {}
+    for node in nodes:
+        yield node_key(parent_key, node.name, occurrences), node
 
 class BlendQueryBuildException(Exception):
     def __init__(self, message):
@@ -0,0 +1,58 @@
+from collections import OrderedDict
+
+import numpy
+
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+
+
+class TessellationMemo:
+    # Least-recently-used map of shape digests to their tessellated vertex and index arrays (and the digest of those arrays).
+    # Builds run in forked children, so a child records what it added and used and the zygote merges that back in,
+    # letting every later fork inherit the entries without copying them.
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE):
+        self.entries = OrderedDict()
+        self.size = 0
+        self.max_size = max_size
+        self.added = {}
+        self.used = []
+
+    def get(self, key: str):
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            self.used.append(key)
+        return entry
+
+    def put(self, key: str, vertices: numpy.ndarray, faces: numpy.ndarray, geometry: str):
+        # Entries are shared between builds, so they must never be modified in place
+        vertices.flags.writeable = False
+        faces.flags.writeable = False
+        self.insert(key, (vertices, faces, geometry))
+        self.added[key] = (vertices, faces, geometry)
+
+    def insert(self, key: str, entry):
+        if key in self.entries:
+            self.size -= entry_size(self.entries.pop(key))
+        self.entries[key] = entry
+        self.size += entry_size(entry)
+        while self.size > self.max_size and len(self.entries) > 1:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= entry_size(evicted)
+
+    def take_changes(self):
+        changes = (self.added, self.used)
+        self.added, self.used = {}, []
+        return changes
+
+    def merge(self, changes):
+        added, used = changes
+        for key in used:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+        for key, entry in added.items():
+            self.insert(key, entry)
+
+
+def entry_size(entry) -> int:
+    vertices, faces, _ = entry
+    return vertices.nbytes + faces.nbytes
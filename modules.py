@@ -0,0 +1,183 @@
+import os
+import ast
+import sys
+import hashlib
+import importlib.abc
+import importlib.util
+
+# A Blender text is importable by the name before this suffix, e.g. `import fasteners` imports the text `fasteners.py`
+TEXT_SUFFIX = ".py"
+
+
+def imported_names(node: ast.AST) -> set:
+    # Top-level names of every absolute import within `node`, e.g. `fasteners` for `from fasteners.metric import bolt`
+    names = set()
+    for child in ast.walk(node):
+        if isinstance(child, ast.Import):
+            names.update(alias.name.split(".")[0] for alias in child.names)
+        elif isinstance(child, ast.ImportFrom) and child.level == 0 and child.module:
+            names.add(child.module.split(".")[0])
+    return names
+
+
+def imported_modules(source: str) -> set:
+    try:
+        return imported_names(ast.parse(source))
+    except SyntaxError:
+        return set()
+
+
+def source_hash(source: str) -> str:
+    return hashlib.blake2b(source.encode(), digest_size=16).hexdigest()
+
+
+def read_source(path: str):
+    try:
+        with open(path, encoding="utf-8") as file:
+            return file.read()
+    except (OSError, UnicodeDecodeError):
+        return None
+
+
+def find_project_module(name: str, paths) -> str:
+    # Source file of a top-level module or package within the project directories, or `None` for anything else (e.g. an installed library)
+    for directory in paths:
+        for path in (os.path.join(directory, name + ".py"), os.path.join(directory, name, "__init__.py")):
+            if os.path.isfile(path):
+                return path
+    return None
+
+
+def package_modules(name: str, path: str):
+    # Every module of the package whose `__init__.py` is at `path`, as `(name, path)`
+    directory = os.path.dirname(path)
+    for root, directories, files in os.walk(directory):
+        directories[:] = sorted(child for child in directories if os.path.isfile(os.path.join(root, child, "__init__.py")))
+        package = ".".join([name] + os.path.relpath(root, directory).split(os.sep)) if root != directory else name
+        for file in sorted(files):
+            if file.endswith(".py"):
+                module = package if file == "__init__.py" else f"{package}.{file[:-3]}"
+                yield module, os.path.join(root, file)
+
+
+def helper_sources(script: str, read_text, paths) -> dict:
+    # The helper modules a script imports, directly or through other helpers, as `{name: (origin, source)}`.
+    # `read_text(name)` returns the source of a Blender text or `None`; texts take precedence over files in the project directories.
+    helpers = {}
+    pending = sorted(imported_modules(script))
+    seen = set()
+    while pending:
+        name = pending.pop()
+        if name in seen:
+            continue
+        seen.add(name)
+        source = read_text(name + TEXT_SUFFIX)
+        if source is not None:
+            modules = [(name, name + TEXT_SUFFIX, source)]
+        else:
+            path = find_project_module(name, paths)
+            if path is None:
+                continue
+            if os.path.basename(path) == "__init__.py":
+                modules = [(module, origin, read_source(origin)) for module, origin in package_modules(name, path)]
+            else:
+                modules = [(name, path, read_source(path))]
+        for module, origin, source in modules:
+            if source is not None:
+                helpers[module] = (origin, source)
+                pending.extend(imported_modules(source))
+    return helpers
+
+
+def helpers_hash(helpers: dict) -> str:
+    return source_hash(repr(sorted((name, source_hash(source)) for name, (_, source) in helpers.items())))
+
+
+def helper_versions(helpers: dict) -> dict:
+    # Version of each top-level helper, which changes with its own source or that of any helper it imports, however indirectly
+    packages = {}
+    for name, (_, source) in helpers.items():
+        package = packages.setdefault(name.split(".")[0], {"hashes": [], "imports": set()})
+        package["hashes"].append((name, source_hash(source)))
+        package["imports"] |= imported_modules(source)
+
+    versions = {}
+    for top in packages:
+        members, pending = set(), [top]
+        while pending:
+            member = pending.pop()
+            if member in packages and member not in members:
+                members.add(member)
+                pending.extend(packages[member]["imports"])
+        versions[top] = source_hash(repr(sorted(hash for member in members for hash in packages[member]["hashes"])))
+    return versions
+
+
+class HelperLoader(importlib.abc.Loader):
+    def __init__(self, origin: str, source: str, loaded: dict):
+        self.origin = origin
+        self.source = source
+        self.loaded = loaded
+
+    def create_module(self, spec):
+        return None
+
+    def exec_module(self, module):
+        module.__file__ = self.origin
+        # Compiled under its text name or file path, so that tracebacks point into the helper rather than `<string>`
+        exec(compile(self.source, self.origin, "exec"), module.__dict__)
+        self.loaded[module.__name__] = source_hash(self.source)
+
+
+class HelperFinder(importlib.abc.MetaPathFinder):
+    # Imports exactly the helpers sent with the build, so that they can neither shadow nor be shadowed by installed libraries
+    def __init__(self, loaded: dict):
+        self.helpers = {}
+        self.loaded = loaded
+
+    def find_spec(self, fullname, path=None, target=None):
+        helper = self.helpers.get(fullname)
+        if helper is None:
+            return None
+        origin, source = helper
+        is_package = os.path.basename(origin) == "__init__.py"
+        spec = importlib.util.spec_from_loader(fullname, HelperLoader(origin, source, self.loaded), origin=origin, is_package=is_package)
+        if is_package:
+            spec.submodule_search_locations = [os.path.dirname(origin)]
+        return spec
+
+
+class HelperModules:
+    # Helpers stay imported for as long as the process does, which for a session spans every build of its object.
+    # Before each build, those whose source changed are dropped, along with every helper importing them, so that
+    # only they are imported again.
+    def __init__(self):
+        # Source hash of every helper module as it was imported, by module name
+        self.loaded = {}
+        self.finder = HelperFinder(self.loaded)
+
+    def prepare(self, helpers: dict) -> dict:
+        # Returns `helper_versions(helpers)`, which an incremental session uses to re-run the imports of changed helpers
+        if self.finder not in sys.meta_path:
+            sys.meta_path.insert(0, self.finder)
+        self.finder.helpers = helpers
+
+        stale_packages = {
+            name.split(".")[0]
+            for name, loaded in self.loaded.items()
+            if name not in helpers or source_hash(helpers[name][1]) != loaded
+        }
+        while True:
+            dependents = {
+                name.split(".")[0]
+                for name in self.loaded
+                if name.split(".")[0] not in stale_packages and name in helpers and imported_modules(helpers[name][1]) & stale_packages
+            }
+            if not dependents:
+                break
+            stale_packages |= dependents
+
+        for name in [name for name in self.loaded if name.split(".")[0] in stale_packages]:
+            del self.loaded[name]
+            sys.modules.pop(name, None)
+        return helper_versions(helpers)
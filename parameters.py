@@ -0,0 +1,67 @@
+import ast
+from typing import List
+from dataclasses import dataclass
+
+# Top-level assignments annotated with one of these and given a literal, e.g. `width: float = 20.0`, are parameters
+PARAMETER_TYPES = {"float": float, "int": int, "bool": bool, "str": str}
+
+
+@dataclass(frozen=True)
+class Parameter:
+    name: str
+    type: str
+    default: object
+
+
+def script_parameters(script: str) -> List[Parameter]:
+    # Read from the syntax alone, so that Blender can list a script's parameters without running it
+    try:
+        statements = ast.parse(script).body
+    except SyntaxError:
+        return []
+    return [parameter for parameter in map(parse_parameter, statements) if parameter is not None]
+
+
+def parse_parameter(statement: ast.stmt):
+    if not (
+        isinstance(statement, ast.AnnAssign)
+        and isinstance(statement.target, ast.Name)
+        and isinstance(statement.annotation, ast.Name)
+        and statement.annotation.id in PARAMETER_TYPES
+        and statement.value is not None
+    ):
+        return None
+    try:
+        value = coerce(statement.annotation.id, ast.literal_eval(statement.value))
+    except ValueError:
+        return None
+    return Parameter(statement.target.id, statement.annotation.id, value)
+
+
+def coerce(type: str, value):
+    # `width: float = 20` is still a float parameter; anything else that does not match its annotation is not a parameter
+    if type == "float" and isinstance(value, int) and not isinstance(value, bool):
+        value = float(value)
+    if not isinstance(value, PARAMETER_TYPES[type]) or (type == "int" and isinstance(value, bool)):
+        raise ValueError(f"{value!r} is not a {type}")
+    return value
+
+
+def apply_parameters(statements: List[ast.stmt], values: dict) -> List[ast.stmt]:
+    # Replaces the value each parameter is declared with, leaving every other statement exactly as it was,
+    # so that an incremental session sees only the parameter statements as changed
+    applied = []
+    for statement in statements:
+        parameter = parse_parameter(statement)
+        if parameter is not None and parameter.name in values:
+            try:
+                value = ast.copy_location(ast.Constant(coerce(parameter.type, values[parameter.name])), statement.value)
+                statement = ast.copy_location(
+                    ast.AnnAssign(target=statement.target, annotation=statement.annotation, value=value, simple=statement.simple),
+                    statement,
+                )
+            except ValueError:
+                # A stale value from before the parameter's type was changed; keep the script's own
+                pass
+        applied.append(statement)
+    return applied
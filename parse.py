@@ -1,16 +1,54 @@
+import io
+import os
+import ast
 import sys
+import time
+import cProfile
 import pickle
+import hashlib
 from typing import Union
-from interop_types import ParametricObjectNode, BlendQueryBuildException
 
-def main():
-  try:
+import numpy
+
+from buffers import BufferWriter, buffer_paths, copy_nodes, write_buffers
+from protocol import write_message
+from cache import TessellationCache
+from memo import TessellationMemo
+from tessellate import discretise_edges, parallel_tessellate, vectors_to_array, weld_vertices
+from incremental import ScriptSession
+from parameters import apply_parameters
+from modules import HelperModules
+from profiling import dump_profile, peak_rss
+from interop_types import BuildOptions, MeshBuffer, ParametricObjectNode, BlendQueryBuildException, node_key
+
+cadquery = None
+build123d = None
+ParametricShape = None
+ParametricObject = None
+# Seconds spent importing the libraries in this process; forked builds inherit them from the zygote rather than paying again
+import_time = None
+
+# Kept warm in the zygote so that shapes which did not change between builds skip tessellation
+tessellation_memo = TessellationMemo()
+# Helper modules imported by scripts; only a session's process lives long enough to reuse them between builds
+helper_modules = HelperModules()
+# Minimum time between progress events within a phase
+PROGRESS_INTERVAL_S = 0.05
+
+
+def import_dependencies():
+    global cadquery, build123d, ParametricShape, ParametricObject, import_time
+    if cadquery is not None and build123d is not None:
+        return
+
+    start = time.perf_counter()
     from setup_venv import setup_venv
     setup_venv()
 
-    # TODO: Investigate return code issue.
     import cadquery
     import build123d
+    # Imported for its side effects so that a warm worker has already paid for loading OCP
+    import OCP
 
     ParametricShape = Union[cadquery.Shape, build123d.Shape]
     ParametricObject = Union[
@@ -19,74 +57,369 @@ def main():
         cadquery.Assembly,
         build123d.Builder,
     ]
+    import_time = time.perf_counter() - start
+
 
-    def parse_parametric_script(script: str):
-        locals = {}
-        globals = {
-            "cadquery": cadquery,
-            "cq": cadquery,
-            # Exclude Build123d here as most examples already import it and it is usually a spread import
-        }
+def execute_parametric_script(script: str, session: ScriptSession = None, parameters: dict = None, helpers: dict = None, incremental: bool = True):
+    # `parameters` replaces the values the script's parameters are declared with, e.g. `width: float = 20.0`.
+    # `helpers` are the Blender texts and project files the script may import, from `modules.helper_sources`.
+    versions = helper_modules.prepare(helpers or {})
+    locals = {}
+    globals = {
+        "cadquery": cadquery,
+        "cq": cadquery,
+        # Exclude Build123d here as most examples already import it and it is usually a spread import
+    }
+    if session is None:
+        if parameters:
+            script = compile(ast.Module(body=apply_parameters(ast.parse(script).body, parameters), type_ignores=[]), "<string>", "exec")
         exec(script, globals, locals)
+    else:
+        # Re-executes only what changed since the session last ran this object's script, which for a new
+        # parameter value is just the statements depending on it (see `ScriptSession.execute` for `incremental`)
+        session.execute(script, globals, locals, parameters, versions, incremental)
+
+    return [
+        (name, value)
+        for name, value in locals.items()
+        # Filter out all non-constructive and hidden objects (those prefixed with "_")
+        if isinstance(value, ParametricObject) and not name.startswith("_")
+    ]
+
+
+def parse_parametric_objects(objects, options: BuildOptions):
+    return [parse_parametric_object(value, name, None, options) for name, value in objects]
+
+
+def build_parametric_script(script: str, options: BuildOptions, cache_key: Union[str, None] = None, cache_size: int = 0, send=None, session: ScriptSession = None, parameters: dict = None, helpers: dict = None):
+    # `send(kind, payload)` streams "phase" events, an optional "preview", an "object" `(key, node)` for every node of the tree as soon
+    # as it is finished (before its children, which it is sent without) and the build's "statistics" once it is done
+    progress = ProgressReporter(send)
+    statistics = {}
+    progress.phase("exec")
+    profiler = cProfile.Profile() if options.profile else None
+    if profiler is not None:
+        profiler.enable()
+    try:
+        objects = execute_parametric_script(script, session, parameters, helpers, options.incremental)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            statistics["profile"] = dump_profile(profiler)
+    if options.progressive and send is not None:
+        # Send a cheap tessellation first for immediate feedback, then refine the same objects without executing the script again
+        progress.phase("preview")
+        send("preview", write_buffers(parse_parametric_objects(objects, options.coarse())))
 
-        return [
-            parse_parametric_object(value, name, None)
-            for name, value in locals.items()
-            # Filter out all non-constructive and hidden objects (those prefixed with "_")
-            if isinstance(value, ParametricObject) and not name.startswith("_")
-        ]
-
-    def parse_parametric_object(object: ParametricObject, name: str, material: Union[str, None]) -> ParametricObjectNode:
-        # Use object properties otherwise inherit them from parent
-        name = object.name if (hasattr(object, 'name') and object.name) else name
-        material = object.material if (hasattr(object, 'material') and object.material) else material
-
-        # TODO: Do we really need to support per-child assemblies? Could we just get CadQuery to flatten into a shape for us..
-        if isinstance(object, cadquery.Assembly):
-            return ParametricObjectNode(
-                name=name, 
-                material=material,
-                children=[parse_parametric_object(child, name, material) for child in object.shapes + object.children],
-            )
-
-        if isinstance(object, ParametricShape):
-            shape = object
-        elif isinstance(object, cadquery.Workplane):
-            # TODO: `object.val().wrapped` is not guaranteed to be `Shape`
-            shape = cadquery.Shape(object.val().wrapped)
-        elif isinstance(object, build123d.Builder):
-            shape = object._obj
+    progress.phase("tessellate", sum(count_shapes(value) for _, value in objects))
+    cache = TessellationCache(max_size=cache_size) if cache_key is not None and cache_size > 0 else None
+    # The file the result is written to, into which streamed nodes are written as they finish
+    writer = open_stream_writer(cache) if send is not None else None
+
+    def stream(key: str, node: ParametricObjectNode):
+        # Blender builds each node as it arrives, so the first parts of a large assembly appear long before its slowest part is done
+        if writer is not None:
+            # Written once, into the result's file, which Blender maps through a link of the node's own
+            writer.write_nodes([node])
+            streamed = copy_nodes([node], writer.link() if buffer_paths([node]) else None)[0]
         else:
-            raise BlendQueryBuildException(
-                "Failed to parse parametric object; Unsupported object type (" + str(type(object)) + ")."
-            )
-        
-        # Tolerances are a trade off between accuracy and performance
-        # `0.01` is decided from a standard of `1u=1m`
-        # TODO: Expose this via object so that it may be configured by the user for generating more/less complex geometry
-        tolerance = 0.01
-        angular_tolerance = 0.01
-        vertices, faces = shape.tessellate(tolerance, angular_tolerance)
-        vertices = [
-            vertex.toTuple() if hasattr(vertex, "toTuple") else vertex.to_tuple()
-            for vertex in vertices
-        ]
-        
-        return ParametricObjectNode(
-            name=name,
-            material=material,
-            vertices=vertices,
-            faces=faces,
+            # The copy keeps its arrays in a file of its own, leaving the originals for the result below
+            streamed = write_buffers(copy_nodes([node]))[0]
+        send("object", (key, streamed))
+
+    parametric_objects = []
+    occurrences = {}
+    try:
+        for name, value in objects:
+            parametric_objects.append(parse_parametric_object(
+                value, name, None, options, progress=progress, stream=stream if send is not None else None, occurrences=occurrences,
+            ))
+    except BaseException:
+        if writer is not None:
+            writer.discard()
+        raise
+    statistics.update(count_geometry(parametric_objects))
+
+    progress.phase("serialize")
+    # Mesh buffers are moved into a mapped file so that only the node tree itself is pickled
+    if cache is not None:
+        # Building straight into the cache means the entry doubles as the mapped file Blender reads from
+        result = cache.store(cache_key, parametric_objects, writer)
+    elif writer is not None:
+        # Every node has already been written while streaming, so the result refers to the same file
+        writer.write_nodes(parametric_objects)
+        writer.close()
+        result = parametric_objects
+    else:
+        result = write_buffers(parametric_objects)
+    progress.finish()
+
+    if send is not None:
+        statistics["timings"] = dict(progress.timings, **({"import": import_time} if import_time is not None else {}))
+        statistics["peak_rss_bytes"] = peak_rss()
+        statistics["executed_statements"] = len(session.executed_records) if session is not None else None
+        send("statistics", statistics)
+    return result
+
+
+class ProgressReporter:
+    # Sends `(phase, completed, total)` events, throttled so that assemblies of many small parts do not flood the stream,
+    # and records how long each phase took
+    def __init__(self, send=None, interval: float = PROGRESS_INTERVAL_S):
+        self.send = send
+        self.interval = interval
+        self.name = None
+        self.completed = 0
+        self.total = 0
+        self.last_sent = 0.0
+        self.started = None
+        self.timings = {}
+
+    def phase(self, name: str, total: int = 0):
+        self.finish()
+        self.name, self.completed, self.total = name, 0, total
+        self.started = time.perf_counter()
+        self.report()
+
+    def finish(self):
+        if self.name is not None:
+            self.timings[self.name] = self.timings.get(self.name, 0.0) + time.perf_counter() - self.started
+            self.name = None
+
+    def advance(self):
+        self.completed += 1
+        if self.completed == self.total or time.monotonic() - self.last_sent >= self.interval:
+            self.report()
+
+    def report(self):
+        if self.send is not None:
+            self.last_sent = time.monotonic()
+            self.send("phase", (self.name, self.completed, self.total))
+
+
+def open_stream_writer(cache: Union[TessellationCache, None]) -> Union[BufferWriter, None]:
+    # The cache entry, or a file for this result alone, if the file system can link to it; otherwise `None`,
+    # and streamed nodes are written to files of their own before the result is written again
+    writer = cache.open_entry() if cache is not None else BufferWriter()
+    try:
+        os.remove(writer.link())
+    except OSError:
+        writer.discard()
+        return None
+    return writer
+
+
+def count_geometry(parametric_objects) -> dict:
+    # Counts every instance, as that is what ends up in the scene
+    counts = {"objects": 0, "vertices": 0, "triangles": 0, "edges": 0}
+
+    def visit(nodes):
+        for node in nodes:
+            counts["objects"] += 1
+            # Streamed nodes have already been written out, leaving a `MeshBuffer` in place of each array
+            if node.vertices is not None:
+                counts["vertices"] += size(node.vertices) // 3
+            if node.faces is not None:
+                counts["triangles"] += size(node.faces) // 3
+            if node.edges is not None:
+                counts["edges"] += size(node.edges) // 2
+            visit(node.children)
+
+    visit(parametric_objects)
+    return counts
+
+
+def size(array) -> int:
+    return array.count if isinstance(array, MeshBuffer) else len(array)
+
+
+def count_shapes(object: ParametricObject) -> int:
+    # Number of shapes `parse_parametric_object` will tessellate, so that progress can be reported as a fraction
+    if isinstance(object, cadquery.Assembly):
+        return len(object.shapes) + sum(count_shapes(child) for child in object.children)
+    if isinstance(object, build123d.Shape) and object.children:
+        return sum(count_shapes(child) for child in object.children)
+    return 1
+
+
+def parse_parametric_object(
+    object: ParametricObject,
+    name: str,
+    material: Union[str, None],
+    options: BuildOptions,
+    matrix=None,
+    progress: ProgressReporter = None,
+    stream=None,
+    parent_key: str = "",
+    occurrences: dict = None,
+) -> ParametricObjectNode:
+    # `stream(key, node)` is called with every node as soon as it is finished, keyed by its position in the tree
+    # (see `node_key`, whose sibling counts are kept in `occurrences`). Assemblies are streamed before their children.
+    # Use object properties otherwise inherit them from parent
+    name = object.name if (hasattr(object, 'name') and object.name) else name
+    material = object.material if (hasattr(object, 'material') and object.material) else material
+    occurrences = {} if occurrences is None else occurrences
+
+    # TODO: Do we really need to support per-child assemblies? Could we just get CadQuery to flatten into a shape for us..
+    if isinstance(object, cadquery.Assembly):
+        # Child assemblies are placed by their `loc`, so their shapes are tessellated in the child's own frame.
+        # Repeated children (e.g. fasteners) then produce identical geometry, which is tessellated and sent once.
+        node, key = parse_assembly(name, material, matrix, stream, parent_key, occurrences)
+        children = {}
+        for shape in object.shapes:
+            node.children.append(parse_parametric_object(shape, name, material, options, None, progress, stream, key, children))
+        for child in object.children:
+            node.children.append(parse_parametric_object(child, name, material, options, location_matrix(child.loc), progress, stream, key, children))
+        return node
+
+    if isinstance(object, build123d.Shape) and object.children:
+        # Build123d assemblies are compounds whose children carry their own location relative to the parent
+        label = object.label or name
+        node, key = parse_assembly(label, material, matrix, stream, parent_key, occurrences)
+        children = {}
+        for child in object.children:
+            node.children.append(parse_parametric_object(
+                child.located(build123d.Location()), child.label or label, material, options, location_matrix(child.location), progress, stream, key, children,
+            ))
+        return node
+
+    if isinstance(object, ParametricShape):
+        shape = object
+    elif isinstance(object, cadquery.Workplane):
+        # TODO: `object.val().wrapped` is not guaranteed to be `Shape`
+        shape = cadquery.Shape(object.val().wrapped)
+    elif isinstance(object, build123d.Builder):
+        shape = object._obj
+    else:
+        raise BlendQueryBuildException(
+            "Failed to parse parametric object; Unsupported object type (" + str(type(object)) + ")."
         )
 
-    parametric_script = pickle.loads(sys.stdin.buffer.read())
-    parametric_objects = parse_parametric_script(parametric_script)
-    sys.stdout.buffer.write(pickle.dumps(parametric_objects))
-    sys.stdout.buffer.flush()
+    vertices, indices, geometry = tessellate(shape, options)
+    geometry = content_hash(None, material, None, geometry)
+    if progress is not None:
+        progress.advance()
+
+    node = ParametricObjectNode(
+        name=name,
+        material=material,
+        vertices=vertices,
+        faces=None if options.wireframe else indices,
+        edges=indices if options.wireframe else None,
+        matrix=matrix,
+        geometry=geometry,
+        hash=content_hash(name, material, matrix, geometry),
+    )
+    key = node_key(parent_key, name, occurrences)
+    if stream is not None:
+        stream(key, node)
+    return node
+
+
+def parse_assembly(name: str, material: Union[str, None], matrix, stream, parent_key: str, occurrences: dict):
+    # An assembly's own node does not depend on its children, so it is streamed straight away for them to be parented to
+    node = ParametricObjectNode(name=name, material=material, matrix=matrix, hash=content_hash(name, material, matrix))
+    key = node_key(parent_key, name, occurrences)
+    if stream is not None:
+        stream(key, node)
+    return node, key
+
+
+def location_matrix(location):
+    # Row-major 4x4 transform, or `None` for the identity so that most nodes carry nothing extra
+    if location is None or location.wrapped.IsIdentity():
+        return None
+    transformation = location.wrapped.Transformation()
+    return tuple(
+        transformation.Value(row, column) for row in (1, 2, 3) for column in (1, 2, 3, 4)
+    ) + (0.0, 0.0, 0.0, 1.0)
+
+
+def tessellate(shape: ParametricShape, options: BuildOptions):
+    # Returns the vertices, the triangle indices (or segment indices for wireframe builds) and their digest
+    key = shape_hash(shape, options)
+    memoised = tessellation_memo.get(key)
+    if memoised is not None:
+        return memoised
+
+    if options.wireframe:
+        vertices, edges = discretise_edges(shape, options)
+        # Join the polylines where edges meet, so that the wireframe is connected like the solid would be
+        vertices, edges = weld_vertices(vertices, edges, options.weld_tolerance, options.drop_degenerate, corners=2)
+        geometry = content_hash(None, None, None, vertices, edges)
+        tessellation_memo.put(key, vertices, edges, geometry)
+        return vertices, edges, geometry
+
+    if options.tessellation_workers > 1:
+        vertices, faces = parallel_tessellate(shape, options)
+    else:
+        # TODO: Expose `options` via object so that it may be configured by the user for generating more/less complex geometry
+        vertices, faces = shape.tessellate(options.tolerance, options.angular_tolerance)
+        vertices = vectors_to_array(vertices)
+        faces = numpy.array(faces, dtype=numpy.int32).reshape(-1)
+    vertices, faces = weld_vertices(vertices, faces, options.weld_tolerance, options.drop_degenerate)
+
+    # Digest the arrays once here, rather than once for every instance that shares them
+    geometry = content_hash(None, None, None, vertices, faces)
+    tessellation_memo.put(key, vertices, faces, geometry)
+    return vertices, faces, geometry
+
+
+def shape_hash(shape: ParametricShape, options: BuildOptions) -> str:
+    # `TopoDS_Shape.HashCode` is only unique within a process, so digest the serialised BRep for a stable geometric identity
+    from OCP.BRepTools import BRepTools
+
+    stream = io.BytesIO()
+    try:
+        from OCP.TopTools import TopTools_FormatVersion
+    except ImportError:
+        # OCCT before 7.6 has no format versions, nor a way to leave the triangulation out, so its digest changes once meshed
+        BRepTools.Write_s(shape.wrapped, stream)
+    else:
+        # Leave out any triangulation already attached to the shape (e.g. by meshing another instance of it), which would
+        # otherwise change its digest. The overload taking the triangulation flags has no default for the format version.
+        BRepTools.Write_s(shape.wrapped, stream, False, False, TopTools_FormatVersion.TopTools_FormatVersion_CURRENT)
+
+    digest = hashlib.blake2b(stream.getbuffer(), digest_size=20)
+    digest.update(repr((options.tolerance, options.angular_tolerance, options.weld_tolerance, options.drop_degenerate, options.wireframe)).encode())
+    return digest.hexdigest()
+
+
+def content_hash(name: Union[str, None], material: Union[str, None], matrix, *parts) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr((name, material, matrix)).encode())
+    for part in parts:
+        if isinstance(part, str):
+            digest.update(part.encode())
+        else:
+            digest.update(part.dtype.str.encode())
+            digest.update(memoryview(numpy.ascontiguousarray(part)).cast("B"))
+    return digest.hexdigest()
+
+
+# One-shot entry point, used where a warm `zygote.py` worker cannot be forked (e.g. Windows)
+def main():
+  output = sys.stdout.buffer
+  # Keep `print` calls from user scripts out of the message stream
+  sys.stdout = sys.stderr
+  try:
+    # TODO: Investigate return code issue.
+    import_dependencies()
+
+    parametric_script, options, cache_key, cache_size, parameters, helpers = pickle.loads(sys.stdin.buffer.read())
+    parametric_objects = build_parametric_script(
+        parametric_script,
+        options,
+        cache_key,
+        cache_size,
+        lambda kind, payload: write_message(output, (kind, payload)),
+        parameters=parameters,
+        helpers=helpers,
+    )
+    write_message(output, ("result", parametric_objects))
     sys.exit(0)
   except Exception as exception:
-    sys.stdout.buffer.write(pickle.dumps(exception))
-    sys.stdout.buffer.flush()
+    write_message(output, ("result", exception))
     sys.exit(1)
 
 if __name__ == "__main__":
@@ -2,53 +2,278 @@ from typing import Callable
 
 import bpy
 import os
+import struct
 
 POLL_RATE = 0.1
+# Cursor and line count changes catch typing immediately; the full text is still compared this often to catch scripted edits
+FULL_CHECK_INTERVAL = 1.0
+# Fallback for platforms without inotify, where external files have to be stat'ed
+FILE_POLL_INTERVAL = 1.0
+
+
+class PollingFileWatcher:
+    def __init__(self, poll_interval: float = FILE_POLL_INTERVAL):
+        self.poll_interval = poll_interval
+        self.modified = {}
+        self.elapsed = 0.0
+
+    def watch(self, path: str):
+        if path not in self.modified:
+            self.modified[path] = modified_time(path)
+
+    def unwatch(self, path: str):
+        self.modified.pop(path, None)
+
+    def poll(self, elapsed: float):
+        self.elapsed += elapsed
+        if self.elapsed < self.poll_interval:
+            return set()
+        self.elapsed = 0.0
+
+        changed = set()
+        for path, last_modified in self.modified.items():
+            modified = modified_time(path)
+            if modified is not None and (last_modified is None or modified > last_modified):
+                self.modified[path] = modified
+                changed.add(path)
+        return changed
+
+
+class InotifyFileWatcher:
+    # Watches the directories of external files, as editors commonly save by replacing the file rather than writing to it
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+    EVENT = struct.Struct("iIII")
+
+    def __init__(self):
+        import ctypes
+        import ctypes.util
+
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self.libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.directories = {}
+        self.paths = {}
+
+    def watch(self, path: str):
+        directory, name = os.path.split(path)
+        if directory not in self.directories.values():
+            mask = self.IN_MODIFY | self.IN_CLOSE_WRITE | self.IN_MOVED_TO | self.IN_CREATE
+            descriptor = self.libc.inotify_add_watch(self.fd, directory.encode(), mask)
+            if descriptor < 0:
+                return
+            self.directories[descriptor] = directory
+        self.paths.setdefault(directory, set()).add(name)
+
+    def unwatch(self, path: str):
+        directory, name = os.path.split(path)
+        names = self.paths.get(directory)
+        if names is None:
+            return
+        names.discard(name)
+        if not names:
+            del self.paths[directory]
+            for descriptor, watched in list(self.directories.items()):
+                if watched == directory:
+                    self.libc.inotify_rm_watch(self.fd, descriptor)
+                    del self.directories[descriptor]
+
+    def poll(self, elapsed: float):
+        changed = set()
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                descriptor, _, _, length = self.EVENT.unpack_from(data, offset)
+                offset += self.EVENT.size
+                name = data[offset:offset + length].rstrip(b"\0").decode(errors="replace")
+                offset += length
+                directory = self.directories.get(descriptor)
+                if directory is not None and name in self.paths.get(directory, ()):
+                    changed.add(os.path.join(directory, name))
+        return changed
+
+
+def create_file_watcher():
+    try:
+        return InotifyFileWatcher()
+    except (OSError, AttributeError, TypeError):
+        return PollingFileWatcher()
+
+
+class WatchedText:
+    def __init__(self, text: bpy.types.Text):
+        self.text = text
+        self.callbacks = []
+        self.filepath = None
+        self.last_hash = hash(text.as_string())
+        self.last_fingerprint = text_fingerprint(text)
+
+
+class TextWatcher:
+    # A single timer watching every text used by BlendQuery objects, however many objects share each text
+    def __init__(self, poll_rate: float = POLL_RATE):
+        self.poll_rate = poll_rate
+        self.watched = {}
+        # Callbacks for files which are not Blender texts, e.g. helper modules imported from the project directory, by path
+        self.files = {}
+        self.file_watcher = None
+        self.since_full_check = 0.0
+
+    def watch(self, text: bpy.types.Text, callback: Callable):
+        watched = self.watched.get(text)
+        if watched is None:
+            watched = self.watched[text] = WatchedText(text)
+        watched.callbacks.append(callback)
+        self.update_filepath(watched)
+        self.start()
+
+        def dispose():
+            if callback in watched.callbacks:
+                watched.callbacks.remove(callback)
+            if not watched.callbacks:
+                self.forget(watched)
+
+        return dispose
+
+    def watch_file(self, path: str, callback: Callable):
+        if self.file_watcher is None:
+            self.file_watcher = create_file_watcher()
+        callbacks = self.files.get(path)
+        if callbacks is None:
+            callbacks = self.files[path] = []
+            self.file_watcher.watch(path)
+        callbacks.append(callback)
+        self.start()
+
+        def dispose():
+            if callback in callbacks:
+                callbacks.remove(callback)
+            if not callbacks and self.files.get(path) is callbacks:
+                del self.files[path]
+                self.file_watcher.unwatch(path)
+                self.stop_if_idle()
+
+        return dispose
+
+    def start(self):
+        if not bpy.app.timers.is_registered(self.timer):
+            bpy.app.timers.register(self.timer, persistent=True)
+
+    def stop_if_idle(self):
+        if not self.watched and not self.files and bpy.app.timers.is_registered(self.timer):
+            bpy.app.timers.unregister(self.timer)
+
+    def forget(self, watched: WatchedText):
+        if self.watched.get(watched.text) is watched:
+            del self.watched[watched.text]
+        if watched.filepath is not None:
+            self.file_watcher.unwatch(watched.filepath)
+            watched.filepath = None
+        self.stop_if_idle()
+
+    def update_filepath(self, watched: WatchedText):
+        text = watched.text
+        filepath = None if text.is_in_memory else bpy.path.abspath(text.filepath, library=text.library)
+        if filepath == watched.filepath:
+            return
+        if self.file_watcher is None:
+            self.file_watcher = create_file_watcher()
+        if watched.filepath is not None:
+            self.file_watcher.unwatch(watched.filepath)
+        if filepath is not None:
+            self.file_watcher.watch(filepath)
+        watched.filepath = filepath
+
+    def timer(self):
+        self.since_full_check += self.poll_rate
+        full_check = self.since_full_check >= FULL_CHECK_INTERVAL
+        if full_check:
+            self.since_full_check = 0.0
+
+        changed_paths = self.file_watcher.poll(self.poll_rate) if self.file_watcher is not None else set()
+
+        for watched in list(self.watched.values()):
+            # Wrap in try/except as sometimes, perhaps due to the fact that we are 'reloading' the text, a `ReferenceError: StructRNA of type Text has been removed` will be thrown
+            try:
+                self.check(watched, changed_paths, full_check)
+            except ReferenceError:
+                self.forget(watched)
+            except:
+                pass
+
+        for path in changed_paths & set(self.files):
+            for callback in list(self.files[path]):
+                callback()
+
+        return self.poll_rate
+
+    def check(self, watched: WatchedText, changed_paths, full_check: bool):
+        text = watched.text
+        # Support filepath of text changing
+        self.update_filepath(watched)
+        # TODO: Find a way to avoid:
+        #           - Marking the blend file as having unsaved changes due to hot reloading external file
+        #           - Overwriting legitimate local changes when external file is modified
+        #       Currently, because we want to load this in the background without `bpy.ops.text.reload`,
+        #       we have to read the file from disk natively, and overwrite the texts contents with `from_string`.
+        #       This subsequently marks the text as being dirty and modified.
+        reloaded = watched.filepath is not None and watched.filepath in changed_paths
+        if reloaded:
+            reload_text(text)
+
+        fingerprint = text_fingerprint(text)
+        # A reloaded file can keep its line count, on a text that was already dirty, so compare the text itself regardless
+        if fingerprint == watched.last_fingerprint and not full_check and not reloaded:
+            return
+        watched.last_fingerprint = fingerprint
+
+        string_hash = hash(text.as_string())
+        if string_hash != watched.last_hash:
+            watched.last_hash = string_hash
+            # Fan out to every object using this text
+            for callback in list(watched.callbacks):
+                callback()
+
+
+text_watcher = TextWatcher()
 
 
 def watch_for_text_changes(
-    text: bpy.types.Text, callback: Callable, poll_rate: float = POLL_RATE
+    text: bpy.types.Text, callback: Callable
 ):
-    abs_filepath = bpy.path.abspath(text.filepath, library=text.library)
-    last_string = text.as_string()
-    last_modified = not text.is_in_memory and os.path.getmtime(abs_filepath) or None
-
-    # TODO: @uki-dev can we pull this outside of this function?
-    def timer():
-        # Wrap in try/except as sometimes, perhaps due to the fact that we are 'reloading' the text, a `ReferenceError: StructRNA of type Text has been removed` will be thrown
-        try:
-            nonlocal last_string, last_modified
-            # Support filepath of text changing
-            abs_filepath = bpy.path.abspath(text.filepath, library=text.library)
-            # TODO: Find a way to avoid:
-            #           - Marking the blend file as having unsaved changes due to hot reloading external file
-            #           - Overwriting legitimate local changes when external file is modified
-            #       Currently, because we want to load this in the background without `bpy.ops.text.reload`,
-            #       we have to read the file from disk natively, and overwrite the texts contents with `from_string`.
-            #       This subsequently marks the text as being dirty and modified.
-            if not text.is_in_memory:
-                # If text is external and it has no local changes, check if it has been modified and `revert` to reload from disk
-                modified = os.path.getmtime(abs_filepath)
-                if modified > last_modified:
-                    last_modified = modified
-                    reload_text(text)
-
-            string = text.as_string()
-            if string != last_string:
-                last_string = string
-                callback()
-        except:
-            pass
+    return text_watcher.watch(text, callback)
+
+
+def watch_for_file_changes(path: str, callback: Callable):
+    return text_watcher.watch_file(path, callback)
 
-        return poll_rate
 
-    bpy.app.timers.register(timer)
+def text_fingerprint(text: bpy.types.Text):
+    # Cheap to read and changes with almost every interactive edit, unlike the text itself which must be copied to compare
+    return (
+        len(text.lines),
+        text.current_line_index,
+        text.current_character,
+        text.select_end_line_index,
+        text.select_end_character,
+        text.is_dirty,
+    )
 
-    def dispose():
-        if bpy.app.timers.is_registered(timer):
-            bpy.app.timers.unregister(timer)
 
-    return dispose
+def modified_time(path: str):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
 
 
 def reload_text(text: bpy.types.Text):
@@ -0,0 +1,61 @@
+import os
+import json
+import time
+import platform
+
+from setup_venv import blendquery_directory
+
+# The build log is rotated once it grows past this size, keeping a single previous log
+MAX_LOG_SIZE = 1024 * 1024
+
+
+def log_path() -> str:
+    return os.path.join(blendquery_directory(), "builds.jsonl")
+
+
+def profile_directory() -> str:
+    return os.path.join(blendquery_directory(), "profiles")
+
+
+def peak_rss():
+    # Peak resident set size in bytes of this process and any processes it has waited on, or `None` where it is not available
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    # Reported in bytes on macOS but in kilobytes elsewhere
+    return peak if platform.system() == "Darwin" else peak * 1024
+
+
+def dump_profile(profiler) -> str:
+    # Written where `pstats.Stats(path)` or a viewer such as snakeviz can load it
+    directory = profile_directory()
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.pstats")
+    profiler.dump_stats(path)
+    return path
+
+
+def log_build(record: dict):
+    # One JSON object per line, so that the log can be filtered and aggregated with ordinary tools
+    path = log_path()
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.exists(path) and os.path.getsize(path) > MAX_LOG_SIZE:
+            os.replace(path, path + ".1")
+        with open(path, "a") as file:
+            file.write(json.dumps(record, default=str) + "\n")
+    except OSError:
+        # Statistics are only diagnostic, so never let them fail a build
+        pass
+
+
+def format_bytes(size) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
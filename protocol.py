@@ -0,0 +1,47 @@
+import pickle
+import struct
+
+# Every message between Blender and a worker is a pickled payload prefixed with its length
+HEADER = struct.Struct("<Q")
+
+
+def encode_message(message) -> bytes:
+    payload = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+    return HEADER.pack(len(payload)) + payload
+
+
+def write_message(stream, message):
+    stream.write(encode_message(message))
+    stream.flush()
+
+
+def read_message(stream):
+    header = stream.read(HEADER.size)
+    if len(header) < HEADER.size:
+        raise EOFError("Worker stream closed.")
+    (size,) = HEADER.unpack(header)
+    payload = stream.read(size)
+    if len(payload) < size:
+        raise EOFError("Worker stream closed mid-message.")
+    return pickle.loads(payload)
+
+
+class MessageBuffer:
+    # Accumulates raw bytes read from a non-blocking pipe and splits them into whole frames
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, data: bytes):
+        self.buffer.extend(data)
+        frames = []
+        while len(self.buffer) >= HEADER.size:
+            (size,) = HEADER.unpack_from(self.buffer)
+            end = HEADER.size + size
+            if len(self.buffer) < end:
+                break
+            frames.append(bytes(self.buffer[HEADER.size:end]))
+            del self.buffer[:end]
+        return frames
+
+    def messages(self, data: bytes):
+        return [pickle.loads(frame) for frame in self.feed(data)]
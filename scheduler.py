@@ -0,0 +1,151 @@
+import os
+import sys
+import heapq
+import struct
+import functools
+import itertools
+from typing import Iterable
+
+# Lower values are built first
+PRIORITY_ACTIVE = 0
+PRIORITY_SELECTED = 1
+PRIORITY_DEFAULT = 2
+
+
+def default_max_workers() -> int:
+    return os.cpu_count() or 1
+
+
+# `proc_pidinfo` flavour returning a `struct proc_taskinfo`: six 64-bit counters, starting with the virtual and resident
+# sizes, followed by twelve 32-bit ones
+PROC_PIDTASKINFO = 4
+PROC_TASKINFO = struct.Struct("=6Q12i")
+# Rights `GetProcessMemoryInfo` needs on the process handle
+PROCESS_QUERY_INFORMATION = 0x0400
+PROCESS_VM_READ = 0x0010
+
+
+def process_rss(pid: int) -> int:
+    # Resident set size in bytes, or `0` where it cannot be measured
+    try:
+        if sys.platform == "win32":
+            return windows_rss(pid)
+        if sys.platform == "darwin":
+            return darwin_rss(pid)
+        with open(f"/proc/{pid}/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return 0
+
+
+@functools.lru_cache(maxsize=None)
+def can_measure_rss() -> bool:
+    # Whether a memory limit can be enforced on this platform at all
+    return process_rss(os.getpid()) > 0
+
+
+@functools.lru_cache(maxsize=None)
+def libproc():
+    import ctypes
+    import ctypes.util
+
+    library = ctypes.CDLL(ctypes.util.find_library("proc") or "libproc.dylib")
+    library.proc_pidinfo.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_uint64, ctypes.c_void_p, ctypes.c_int]
+    library.proc_pidinfo.restype = ctypes.c_int
+    return library
+
+
+def darwin_rss(pid: int) -> int:
+    import ctypes
+
+    buffer = ctypes.create_string_buffer(PROC_TASKINFO.size)
+    if libproc().proc_pidinfo(pid, PROC_PIDTASKINFO, 0, buffer, PROC_TASKINFO.size) != PROC_TASKINFO.size:
+        return 0
+    return PROC_TASKINFO.unpack(buffer.raw)[1]
+
+
+@functools.lru_cache(maxsize=None)
+def kernel32():
+    import ctypes
+    from ctypes import wintypes
+
+    library = ctypes.WinDLL("kernel32", use_last_error=True)
+    library.OpenProcess.argtypes = [wintypes.DWORD, wintypes.BOOL, wintypes.DWORD]
+    library.OpenProcess.restype = wintypes.HANDLE
+    # Exported by kernel32 itself since Windows 7, rather than only by psapi
+    library.K32GetProcessMemoryInfo.argtypes = [wintypes.HANDLE, ctypes.c_void_p, wintypes.DWORD]
+    library.K32GetProcessMemoryInfo.restype = wintypes.BOOL
+    library.CloseHandle.argtypes = [wintypes.HANDLE]
+    return library
+
+
+def windows_rss(pid: int) -> int:
+    import ctypes
+    from ctypes import wintypes
+
+    class ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [
+            ("cb", wintypes.DWORD),
+            ("PageFaultCount", wintypes.DWORD),
+            ("PeakWorkingSetSize", ctypes.c_size_t),
+            ("WorkingSetSize", ctypes.c_size_t),
+            ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+            ("PagefileUsage", ctypes.c_size_t),
+            ("PeakPagefileUsage", ctypes.c_size_t),
+        ]
+
+    handle = kernel32().OpenProcess(PROCESS_QUERY_INFORMATION | PROCESS_VM_READ, False, pid)
+    if not handle:
+        return 0
+    try:
+        counters = ProcessMemoryCounters(cb=ctypes.sizeof(ProcessMemoryCounters))
+        if not kernel32().K32GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+            return 0
+        # The working set is Windows' equivalent of the resident set
+        return counters.WorkingSetSize
+    finally:
+        kernel32().CloseHandle(handle)
+
+
+class BuildQueue:
+    # Orders pending builds by priority and decides how many may run at once,
+    # so that opening a file with many parametric objects does not start every build simultaneously
+    def __init__(self, max_workers: int = 0, max_memory: int = 0):
+        self.heap = []
+        self.sequence = itertools.count()
+        self.max_workers = max_workers or default_max_workers()
+        self.max_memory = max_memory
+
+    def configure(self, max_workers: int = 0, max_memory: int = 0):
+        self.max_workers = max_workers or default_max_workers()
+        self.max_memory = max_memory
+
+    def push(self, item, priority: int = PRIORITY_DEFAULT):
+        # The sequence keeps builds of equal priority in submission order
+        heapq.heappush(self.heap, (priority, next(self.sequence), item))
+
+    def remove(self, predicate):
+        self.heap = [entry for entry in self.heap if not predicate(entry[2])]
+        heapq.heapify(self.heap)
+
+    def pop_ready(self, running_pids: Iterable[int]):
+        running_pids = list(running_pids)
+        ready = []
+        while self.heap and self.can_start(running_pids, len(ready)):
+            ready.append(heapq.heappop(self.heap)[2])
+        return ready
+
+    def can_start(self, running_pids, starting: int) -> bool:
+        running = len(running_pids) + starting
+        if running >= self.max_workers:
+            return False
+        # Always allow a single build, otherwise a cap below the size of one build would stall the queue forever
+        if self.max_memory and running > 0:
+            return sum(process_rss(pid) for pid in running_pids) < self.max_memory
+        return True
+
+    def __len__(self):
+        return len(self.heap)
@@ -3,19 +3,27 @@ import sys
 import venv
 import platform
 
-def setup_venv():
+def blendquery_directory():
     if platform.system() == "Windows":
         user_dir = os.environ["USERPROFILE"]
     else:
         user_dir = os.environ["HOME"]
+    return os.path.join(user_dir, "blendquery")
+
+def venv_directory():
     version_info = sys.version_info
     version_string = f"{version_info.major}.{version_info.minor}.{version_info.micro}"
-    venv_dir = os.path.join(user_dir, f"blendquery/{version_string}")
+    return os.path.join(blendquery_directory(), version_string)
+
+def setup_venv():
+    venv_dir = venv_directory()
 
     if not os.path.exists(os.path.join(venv_dir, "pyvenv.cfg")):
         builder = venv.EnvBuilder(with_pip=True)
         builder.create(venv_dir)
 
-    sys.path.append(os.path.join(venv_dir, "Lib", "site-packages"))
+    site_packages = os.path.join(venv_dir, "Lib", "site-packages")
+    if site_packages not in sys.path:
+        sys.path.append(site_packages)
 
     return venv_dir
@@ -0,0 +1,180 @@
+import os
+import pickle
+import itertools
+
+import numpy
+
+from interop_types import BuildOptions
+
+
+def vectors_to_array(vectors) -> numpy.ndarray:
+    # CadQuery and Build123d name their coordinates differently, so pick the accessor once rather than per vertex
+    if not vectors:
+        return numpy.empty(0, dtype=numpy.float32)
+    to_tuple = type(vectors[0]).toTuple if hasattr(vectors[0], "toTuple") else type(vectors[0]).to_tuple
+    return numpy.fromiter(
+        itertools.chain.from_iterable(map(to_tuple, vectors)),
+        dtype=numpy.float32,
+        count=len(vectors) * 3,
+    )
+
+
+def weld_vertices(vertices: numpy.ndarray, faces: numpy.ndarray, tolerance: float, drop_degenerate: bool = True, corners: int = 3):
+    # Faces are meshed separately, so every vertex on an edge between faces is repeated once per face (and likewise
+    # where discretised edges meet). Merge vertices which fall into the same `tolerance` sized cell and point the
+    # triangles (or, with `corners=2`, the edge segments) at the survivors.
+    if tolerance <= 0 or len(vertices) == 0:
+        return vertices, faces
+    points = vertices.reshape(-1, 3)
+    cells = numpy.round(points.astype(numpy.float64) / tolerance).astype(numpy.int64)
+    _, first, inverse = numpy.unique(cells, axis=0, return_index=True, return_inverse=True)
+    # Keep the survivors in their original order, so that the output does not depend on how `unique` sorts
+    order = numpy.argsort(first)
+    remap = numpy.empty(len(order), dtype=numpy.int32)
+    remap[order] = numpy.arange(len(order), dtype=numpy.int32)
+    welded_vertices = numpy.ascontiguousarray(points[first[order]]).reshape(-1)
+    triangles = remap[inverse.reshape(-1)][faces].reshape(-1, corners)
+
+    if drop_degenerate:
+        # Triangles thinner than the tolerance (or segments shorter than it) collapse onto fewer vertices once welded
+        ordered = numpy.sort(triangles, axis=1)
+        triangles = triangles[(ordered[:, 1:] != ordered[:, :-1]).all(axis=1)]
+    return welded_vertices, numpy.ascontiguousarray(triangles, dtype=numpy.int32).reshape(-1)
+
+
+def discretise_edges(shape, options: BuildOptions):
+    # Samples every edge into a polyline, returned as flat vertices and flat vertex index pairs (one pair per segment)
+    from OCP.BRep import BRep_Tool
+    from OCP.BRepAdaptor import BRepAdaptor_Curve
+    from OCP.GCPnts import GCPnts_TangentialDeflection
+    from OCP.TopAbs import TopAbs_EDGE
+    from OCP.TopExp import TopExp
+    from OCP.TopoDS import TopoDS
+    from OCP.TopTools import TopTools_IndexedMapOfShape
+
+    # An edge bounds two faces but appears once in the map, so it is only discretised once
+    edges = TopTools_IndexedMapOfShape()
+    TopExp.MapShapes_s(shape.wrapped, TopAbs_EDGE, edges)
+
+    vertices = []
+    segments = []
+    for index in range(1, edges.Extent() + 1):
+        edge = TopoDS.Edge_s(edges.FindKey(index))
+        # e.g. the apex of a cone, which has no length to draw
+        if BRep_Tool.Degenerated_s(edge):
+            continue
+        points = GCPnts_TangentialDeflection(BRepAdaptor_Curve(edge), options.angular_tolerance, options.tolerance)
+        start = len(vertices) // 3
+        for point_index in range(1, points.NbPoints() + 1):
+            point = points.Value(point_index)
+            vertices.extend((point.X(), point.Y(), point.Z()))
+        for offset in range(points.NbPoints() - 1):
+            segments.extend((start + offset, start + offset + 1))
+
+    return numpy.array(vertices, dtype=numpy.float32), numpy.array(segments, dtype=numpy.int32)
+
+
+def shape_faces(shape):
+    from OCP.TopAbs import TopAbs_FACE
+    from OCP.TopExp import TopExp_Explorer
+    from OCP.TopoDS import TopoDS
+
+    faces = []
+    explorer = TopExp_Explorer(shape.wrapped, TopAbs_FACE)
+    while explorer.More():
+        faces.append(TopoDS.Face_s(explorer.Current()))
+        explorer.Next()
+    return faces
+
+
+def triangulate_faces(faces):
+    # Reads the triangulation already attached to each face into flat arrays, in the same layout as `Shape.tessellate`
+    from OCP.BRep import BRep_Tool
+    from OCP.TopAbs import TopAbs_REVERSED
+    from OCP.TopLoc import TopLoc_Location
+
+    vertices = []
+    triangles = []
+    offset = 0
+    for face in faces:
+        location = TopLoc_Location()
+        triangulation = BRep_Tool.Triangulation_s(face, location)
+        if triangulation is None:
+            continue
+        transformation = location.Transformation()
+        is_reversed = face.Orientation() == TopAbs_REVERSED
+
+        for index in range(1, triangulation.NbNodes() + 1):
+            point = triangulation.Node(index).Transformed(transformation)
+            vertices.extend((point.X(), point.Y(), point.Z()))
+        for index in range(1, triangulation.NbTriangles() + 1):
+            a, b, c = triangulation.Triangle(index).Get()
+            if is_reversed:
+                b, c = c, b
+            triangles.extend((offset + a - 1, offset + b - 1, offset + c - 1))
+        offset += triangulation.NbNodes()
+
+    return numpy.array(vertices, dtype=numpy.float32), numpy.array(triangles, dtype=numpy.int32)
+
+
+def merge_triangulations(triangulations):
+    # Each part is indexed from zero, so shift its indices past the vertices of the parts before it
+    vertices = []
+    faces = []
+    offset = 0
+    for part_vertices, part_faces in triangulations:
+        vertices.append(part_vertices)
+        faces.append(part_faces + offset)
+        offset += len(part_vertices) // 3
+    if not vertices:
+        return numpy.empty(0, dtype=numpy.float32), numpy.empty(0, dtype=numpy.int32)
+    return numpy.concatenate(vertices), numpy.concatenate(faces).astype(numpy.int32, copy=False)
+
+
+def parallel_tessellate(shape, options: BuildOptions):
+    from OCP.BRepMesh import BRepMesh_IncrementalMesh
+
+    # Let OCCT mesh the faces across its own thread pool; shared edges are discretised once, so faces stay watertight
+    BRepMesh_IncrementalMesh(shape.wrapped, options.tolerance, True, options.angular_tolerance, True)
+
+    faces = shape_faces(shape)
+    workers = min(options.tessellation_workers, len(faces))
+    if workers <= 1 or not hasattr(os, "fork"):
+        return triangulate_faces(faces)
+
+    # Reading the triangulation back is bound by the GIL, so split the faces between forked processes,
+    # which inherit the meshed shape without it having to be serialised
+    chunk_size = -(-len(faces) // workers)
+    children = []
+    for start in range(0, len(faces), chunk_size):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            status = 0
+            try:
+                payload = pickle.dumps(triangulate_faces(faces[start:start + chunk_size]), protocol=pickle.HIGHEST_PROTOCOL)
+                with os.fdopen(write_fd, "wb") as pipe:
+                    pipe.write(payload)
+            except BaseException:
+                status = 1
+            finally:
+                os._exit(status)
+        os.close(write_fd)
+        children.append((pid, read_fd))
+
+    triangulations = []
+    failed = False
+    for pid, read_fd in children:
+        with os.fdopen(read_fd, "rb") as pipe:
+            payload = pipe.read()
+        _, status = os.waitpid(pid, 0)
+        if status != 0 or not payload:
+            failed = True
+        elif not failed:
+            triangulations.append(pickle.loads(payload))
+
+    if failed:
+        # Fall back to reading every face here rather than failing the whole build
+        return triangulate_faces(faces)
+    return merge_triangulations(triangulations)
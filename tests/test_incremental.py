@@ -0,0 +1,90 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from incremental import ScriptSession
+
+HOLDER = """
+class Holder:
+    def __init__(self, items):
+        self.items = items
+"""
+
+
+def run(session: ScriptSession, script: str, parameters: dict = None) -> dict:
+    locals = {}
+    session.execute(script, {}, locals, parameters)
+    return locals
+
+
+def test_unchanged_statements_are_replayed():
+    session = ScriptSession()
+    run(session, "a = [1]\nb = len(a)\nc = 2")
+    locals = run(session, "a = [1]\nb = len(a)\nc = 3")
+    assert locals["c"] == 3
+    assert len(session.executed_records) == 1
+
+
+def test_mutation_through_attribute_chain_of_recreated_object():
+    session = ScriptSession()
+    script = HOLDER + "items = [0]\nholder = Holder(items)\nholder.items.append({})\nk = 1\nout = list(items)"
+    run(session, script.format(5))
+    locals = run(session, script.format(6))
+    assert locals["items"] == [0, 6]
+    assert locals["out"] == [0, 6]
+
+
+def test_mutation_of_object_reached_through_replayed_container():
+    session = ScriptSession()
+    script = HOLDER + "config = {{'items': []}}\nholder = Holder(config['items'])\nholder.items.append({})\nout = list(config['items'])"
+    run(session, script.format(5))
+    locals = run(session, script.format(6))
+    assert locals["config"] == {"items": [6]}
+    assert locals["out"] == [6]
+
+
+def test_parameter_mutating_nested_object():
+    session = ScriptSession()
+    script = HOLDER + (
+        "width: float = 20.0\n"
+        "body = Holder([])\n"
+        "holder = Holder(None)\n"
+        "holder.part = body\n"
+        "holder.part.items.append(width)\n"
+        "result = list(body.items)"
+    )
+    run(session, script)
+    run(session, script, {"width": 25.0})
+    locals = run(session, script, {"width": 30.0})
+    assert locals["body"].items == [30.0]
+    assert locals["result"] == [30.0]
+
+
+def test_shared_immutable_values_do_not_prevent_replay():
+    session = ScriptSession()
+    script = HOLDER + "size = (10, 20)\nholder = Holder([])\nholder.items.append({})"
+    run(session, script.format(1))
+    locals = run(session, script.format(2))
+    assert locals["holder"].items == [2]
+    assert len(session.executed_records) == 2
+
+
+def test_parameter_changes_replay_without_incremental():
+    session = ScriptSession()
+    script = "width: float = 20.0\nbase = [1, 2]\ntotal = sum(base) + width"
+    session.execute(script, {}, {}, incremental=False)
+    locals = {}
+    session.execute(script, {}, locals, {"width": 25.0}, incremental=False)
+    assert locals["total"] == 28.0
+    assert len(session.executed_records) == 2
+
+
+def test_other_edits_run_in_full_without_incremental():
+    session = ScriptSession()
+    session.execute("a = [1]\nb = 2", {}, {}, incremental=False)
+    session.execute("a = [1]\nb = 3", {}, {}, incremental=False)
+    assert len(session.executed_records) == 2
+    # Running the same script with the same parameters again is an explicit rebuild, which also runs in full
+    session.execute("a = [1]\nb = 3", {}, {}, incremental=False)
+    assert len(session.executed_records) == 2
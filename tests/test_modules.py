@@ -0,0 +1,76 @@
+import os
+import sys
+import importlib
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules import HelperModules, helper_sources, helper_versions
+
+SCRIPT = "import bq_parts\nimport bq_colours"
+
+
+def write(directory, path: str, source: str):
+    path = directory / path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(source)
+
+
+@pytest.fixture
+def project(tmp_path):
+    write(tmp_path, "bq_shapes/__init__.py", "from bq_shapes.metric import SIZE")
+    write(tmp_path, "bq_shapes/metric.py", "SIZE = 1")
+    write(tmp_path, "bq_parts.py", "import bq_shapes\nWIDTH = bq_shapes.SIZE * 2")
+    write(tmp_path, "bq_colours.py", "RED = (1, 0, 0)")
+    return tmp_path
+
+
+@pytest.fixture
+def helper_modules():
+    modules = HelperModules()
+    yield modules
+    sys.meta_path.remove(modules.finder)
+    for name in list(sys.modules):
+        if name.startswith("bq_"):
+            del sys.modules[name]
+
+
+def no_texts(name: str):
+    return None
+
+
+def test_changed_submodule_invalidates_package_and_importers(project, helper_modules):
+    helpers = helper_sources(SCRIPT, no_texts, [str(project)])
+    assert sorted(helpers) == ["bq_colours", "bq_parts", "bq_shapes", "bq_shapes.metric"]
+    versions = helper_modules.prepare(helpers)
+    assert importlib.import_module("bq_parts").WIDTH == 2
+    colours = importlib.import_module("bq_colours")
+
+    write(project, "bq_shapes/metric.py", "SIZE = 5")
+    helpers = helper_sources(SCRIPT, no_texts, [str(project)])
+    changed = helper_modules.prepare(helpers)
+    for name in ("bq_shapes", "bq_shapes.metric", "bq_parts"):
+        assert name not in sys.modules
+        assert name not in helper_modules.loaded
+        assert changed[name.split(".")[0]] != versions[name.split(".")[0]]
+    assert sys.modules["bq_colours"] is colours
+    assert changed["bq_colours"] == versions["bq_colours"]
+    assert importlib.import_module("bq_parts").WIDTH == 10
+
+
+def test_unchanged_helpers_stay_imported(project, helper_modules):
+    helpers = helper_sources(SCRIPT, no_texts, [str(project)])
+    helper_modules.prepare(helpers)
+    parts = importlib.import_module("bq_parts")
+    assert helper_modules.prepare(helper_sources(SCRIPT, no_texts, [str(project)])) == helper_versions(helpers)
+    assert sys.modules["bq_parts"] is parts
+
+
+def test_text_shadows_project_file(project):
+    texts = {"bq_colours.py": "import bq_shapes\nRED = (0.8, 0, 0)"}
+    helpers = helper_sources(SCRIPT, texts.get, [str(project)])
+    assert helpers["bq_colours"] == ("bq_colours.py", texts["bq_colours.py"])
+    # Imports of the text are still resolved, including from the project directories
+    assert "bq_shapes.metric" in helpers
+    assert helpers["bq_parts"][0] == os.path.join(str(project), "bq_parts.py")
@@ -0,0 +1,275 @@
+import os
+import sys
+import queue
+import pickle
+import socket
+import itertools
+import threading
+import subprocess
+
+from buffers import release_buffers
+from interop_types import BuildOptions, BlendQueryBuildException
+from protocol import read_message, write_message
+from scheduler import BuildQueue, PRIORITY_DEFAULT
+from setup_venv import blendquery_directory
+
+DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+
+def daemon_socket_path() -> str:
+    return os.path.join(blendquery_directory(), "daemon.sock")
+
+
+def worker_environment():
+    parent_directory = os.path.abspath(os.path.join(DIRECTORY, '..'))
+    env = os.environ.copy()
+    env['PATH'] = parent_directory
+    return env
+
+
+class Build:
+    # A submitted build; `response` receives `(kind, payload)` messages: "phase" events, optionally a "preview",
+    # an "object" `(key, node)` for every node of the tree as it is finished, and always ending with a "result"
+    def __init__(self, worker, request_id):
+        self.worker = worker
+        self.request_id = request_id
+        self.response = queue.Queue()
+        self.cancelled = False
+
+    def cancel(self):
+        if not self.cancelled:
+            self.cancelled = True
+            self.worker.cancel(self)
+
+    def fail(self, exception: Exception):
+        self.response.put(("result", exception))
+
+
+def discard(kind, payload):
+    # Nobody will build this result, so remove the files behind its buffers now
+    if kind == "object":
+        release_buffers([payload[1]])
+    elif isinstance(payload, list):
+        release_buffers(payload)
+
+
+class DaemonConnection:
+    # Stands in for the `zygote.py` process when builds are sent to a shared `daemon.py` instead, which speaks the same protocol
+    def __init__(self, connection: socket.socket):
+        self.connection = connection
+        self.stdin = connection.makefile("wb")
+        self.stdout = connection.makefile("rb")
+        self.returncode = None
+
+    def wait(self):
+        return self.returncode
+
+    def terminate(self):
+        try:
+            self.connection.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.connection.close()
+
+
+def connect_daemon():
+    # Returns a connection to the build daemon, or `None` if it is not running
+    path = daemon_socket_path()
+    if not hasattr(socket, "AF_UNIX") or not os.path.exists(path):
+        return None
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(path)
+    except OSError:
+        connection.close()
+        return None
+    return DaemonConnection(connection)
+
+
+class ZygoteWorker:
+    # Talks to a single long-lived `zygote.py` process, which forks a fresh child for every build.
+    # If a `daemon.py` is running, it takes the place of that process for every Blender instance on the machine.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.process = None
+        self.pending = {}
+        self.request_ids = itertools.count()
+        self.settings = {}
+
+    def start(self):
+        with self.lock:
+            self.ensure_process()
+
+    def configure(self, **settings):
+        with self.lock:
+            self.settings = settings
+            if self.process is not None:
+                try:
+                    write_message(self.process.stdin, ("configure", None, settings))
+                except OSError:
+                    pass
+
+    def submit(self, script: str, options: BuildOptions, priority: int = PRIORITY_DEFAULT, cache_key: str = None, session=None, parameters: dict = None, helpers: dict = None) -> Build:
+        # Builds sharing a `session` key evaluate their script incrementally, reusing the statements (and helper modules) of the previous build.
+        # `parameters` overrides the values of the script's declared parameters, and `helpers` are the modules it may import.
+        with self.lock:
+            process = self.ensure_process()
+            build = Build(self, next(self.request_ids))
+            self.pending[build.request_id] = build
+            try:
+                write_message(process.stdin, ("build", build.request_id, script, options, priority, cache_key, session, parameters, helpers))
+            except OSError:
+                # The worker died between builds; the reader thread will clear it so that the next build respawns it
+                del self.pending[build.request_id]
+                build.fail(BlendQueryBuildException("Build worker is not running; please regenerate again."))
+        return build
+
+    def cancel(self, build: Build):
+        with self.lock:
+            if self.pending.pop(build.request_id, None) is None or self.process is None:
+                return
+            try:
+                write_message(self.process.stdin, ("cancel", build.request_id))
+            except OSError:
+                pass
+
+    def shutdown(self):
+        with self.lock:
+            process = self.process
+            self.process = None
+        if process is not None:
+            try:
+                process.stdin.close()
+            except OSError:
+                pass
+            process.terminate()
+
+    def ensure_process(self):
+        # Must be called with `self.lock` held
+        if self.process is None:
+            self.process = connect_daemon() or subprocess.Popen(
+                [sys.executable, "zygote.py"],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                cwd=DIRECTORY,
+                env=worker_environment(),
+            )
+            thread = threading.Thread(target=self.read, args=(self.process,), daemon=True)
+            thread.start()
+            if self.settings:
+                write_message(self.process.stdin, ("configure", None, self.settings))
+        return self.process
+
+    def read(self, process):
+        try:
+            while True:
+                request_id, kind, payload = read_message(process.stdout)
+                with self.lock:
+                    if kind == "result":
+                        build = self.pending.pop(request_id, None)
+                    else:
+                        build = self.pending.get(request_id)
+                if build is None:
+                    discard(kind, payload)
+                else:
+                    build.response.put((kind, payload))
+        except (EOFError, OSError):
+            pass
+
+        process.wait()
+        with self.lock:
+            if self.process is process:
+                self.process = None
+            pending, self.pending = self.pending, {}
+        # Any build that was in flight when the worker crashed will never get a result, so fail it rather than waiting forever.
+        # The next build starts a worker again, or reconnects to the daemon if it is back.
+        reason = "build daemon disconnected" if isinstance(process, DaemonConnection) else f"exit code {process.returncode}"
+        for build in pending.values():
+            build.fail(BlendQueryBuildException(f"Build worker exited unexpectedly ({reason})."))
+
+
+class SubprocessWorker:
+    # Fallback for platforms without `os.fork`, which spawns a fresh `parse.py` interpreter for every build
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.queue = BuildQueue()
+        self.request_ids = itertools.count()
+        # Running `parse.py` processes and the build each one is working on
+        self.running = {}
+        self.cache_size = 0
+
+    def start(self):
+        pass
+
+    def configure(self, **settings):
+        with self.lock:
+            self.queue.configure(settings.get("max_workers", 0), settings.get("max_memory", 0))
+            self.cache_size = settings.get("cache_size", 0)
+        self.schedule()
+
+    def submit(self, script: str, options: BuildOptions, priority: int = PRIORITY_DEFAULT, cache_key: str = None, session=None, parameters: dict = None, helpers: dict = None) -> Build:
+        # Every build is a fresh interpreter here, so there is no session to keep scripts' state in and they always run in full
+        with self.lock:
+            build = Build(self, next(self.request_ids))
+            self.queue.push(((script, options, cache_key, self.cache_size, parameters, helpers), build), priority)
+        self.schedule()
+        return build
+
+    def cancel(self, build: Build):
+        with self.lock:
+            self.queue.remove(lambda queued: queued[1] is build)
+            for process, running in self.running.items():
+                if running is build:
+                    process.kill()
+
+    def schedule(self):
+        with self.lock:
+            for request, build in self.queue.pop_ready(process.pid for process in self.running):
+                process = subprocess.Popen(
+                    [sys.executable, "parse.py"],
+                    stdin=subprocess.PIPE,
+                    stdout=subprocess.PIPE,
+                    cwd=DIRECTORY,
+                    env=worker_environment(),
+                )
+                self.running[process] = build
+                thread = threading.Thread(target=self.communicate, args=(process, request, build), daemon=True)
+                thread.start()
+
+    def communicate(self, process: subprocess.Popen, request, build: Build):
+        responded = False
+        try:
+            process.stdin.write(pickle.dumps(request))
+            process.stdin.close()
+
+            assert process.stdout
+            while True:
+                try:
+                    kind, payload = read_message(process.stdout)
+                except EOFError:
+                    break
+                if build.cancelled:
+                    discard(kind, payload)
+                else:
+                    responded = responded or kind == "result"
+                    build.response.put((kind, payload))
+            process.wait()
+
+            if not responded and not build.cancelled:
+                build.fail(BlendQueryBuildException(f"Build process exited unexpectedly (exit code {process.returncode})."))
+        except Exception as exception:
+            if not responded:
+                build.fail(exception)
+        finally:
+            with self.lock:
+                del self.running[process]
+            self.schedule()
+
+    def shutdown(self):
+        pass
+
+
+def create_worker():
+    if hasattr(os, "fork"):
+        return ZygoteWorker()
+    return SubprocessWorker()
@@ -0,0 +1,290 @@
+import os
+import sys
+import pickle
+import time
+import signal
+import selectors
+import traceback
+
+from interop_types import BlendQueryBuildException
+from incremental import ScriptSession
+from protocol import HEADER, MessageBuffer, encode_message, read_message
+from scheduler import BuildQueue
+
+READ_SIZE = 1 << 16
+# Idle sessions hold every value their script produced, so only the most recently used are kept
+MAX_SESSIONS = 8
+
+
+class Child:
+    def __init__(self, request_id, pid: int, fd: int, session=None, control_fd: int = None):
+        self.request_id = request_id
+        self.pid = pid
+        self.fd = fd
+        self.buffer = MessageBuffer()
+        self.responded = False
+        # Session children outlive their build, waiting on `control_fd` for the next build of the same object
+        self.session = session
+        self.control_fd = control_fd
+        self.busy = True
+        self.last_used = time.monotonic()
+
+
+class Zygote:
+    # A long-lived process that imports CadQuery, Build123d and OCP once, then forks a clean child per build
+    # so that each build is isolated from every other build without paying for the import again
+    def __init__(self, input_fd: int, output_fd: int):
+        self.input_fd = input_fd
+        self.output_fd = output_fd
+        self.input_buffer = MessageBuffer()
+        self.selector = selectors.DefaultSelector()
+        self.children = {}
+        # Session children by session key, which keep the state of incrementally evaluated scripts between builds
+        self.sessions = {}
+        self.queue = BuildQueue()
+        self.cache_size = 0
+        self.import_error = None
+
+    def warm(self):
+        try:
+            import parse
+            parse.import_dependencies()
+        except Exception as exception:
+            # Keep serving so that every build can report why it cannot run, rather than dying and being respawned in a loop
+            self.import_error = exception
+
+    def send(self, message):
+        self.send_frame(encode_message(message))
+
+    def forward(self, frame: bytes, request_id, kind: str, payload):
+        # Passes on a message from a build, already pickled as `frame`
+        self.send_frame(encode_frame_prefix(frame))
+
+    def send_frame(self, frame: bytes):
+        view = memoryview(frame)
+        while view:
+            written = os.write(self.output_fd, view)
+            view = view[written:]
+
+    def serve(self):
+        self.selector.register(self.input_fd, selectors.EVENT_READ)
+        while True:
+            for key, _ in self.selector.select():
+                if key.fd == self.input_fd:
+                    data = os.read(self.input_fd, READ_SIZE)
+                    if not data:
+                        # Blender has gone away, so there is nobody left to build for
+                        return
+                    for message in self.input_buffer.messages(data):
+                        self.handle(message)
+                else:
+                    self.read_child(key.data)
+
+    def handle(self, message):
+        kind, request_id, *payload = message
+        if kind == "build":
+            script, options, priority, cache_key, session, parameters, helpers = payload
+            self.queue.push((request_id, script, parameters, helpers, options, cache_key, session), priority)
+        elif kind == "cancel":
+            self.cancel(request_id)
+        elif kind == "configure":
+            (settings,) = payload
+            self.queue.configure(settings.get("max_workers", 0), settings.get("max_memory", 0))
+            self.cache_size = settings.get("cache_size", 0)
+        self.schedule()
+
+    def schedule(self):
+        running_pids = [child.pid for child in self.children.values() if child.busy]
+        for request_id, script, parameters, helpers, options, cache_key, session in self.queue.pop_ready(running_pids):
+            child = self.sessions.get(session)
+            if child is None:
+                self.fork(request_id, script, parameters, helpers, options, cache_key, session)
+            elif child.busy:
+                # The session is still building an earlier edit, so build this one from scratch rather than wait
+                self.fork(request_id, script, parameters, helpers, options, cache_key)
+            else:
+                self.resume(child, request_id, script, parameters, helpers, options, cache_key)
+
+    def cancel(self, request_id):
+        # Blender no longer wants this build, so drop it from the queue or stop it where it is
+        self.queue.remove(lambda build: build[0] == request_id)
+        for child in self.children.values():
+            if child.request_id == request_id:
+                child.responded = True
+                try:
+                    os.kill(child.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+
+    def fork(self, request_id, script: str, parameters, helpers, options, cache_key, session=None):
+        read_fd, write_fd = os.pipe()
+        control_read_fd, control_fd = os.pipe() if session is not None else (None, None)
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            if control_fd is not None:
+                os.close(control_fd)
+            self.run_child(request_id, script, parameters, helpers, options, cache_key, write_fd, control_read_fd)
+        os.close(write_fd)
+        if control_read_fd is not None:
+            os.close(control_read_fd)
+        child = Child(request_id, pid, read_fd, session, control_fd)
+        self.children[read_fd] = child
+        self.selector.register(read_fd, selectors.EVENT_READ, child)
+        if session is not None:
+            self.sessions[session] = child
+            self.evict_sessions()
+
+    def resume(self, child: Child, request_id, script: str, parameters, helpers, options, cache_key):
+        child.request_id = request_id
+        child.responded = False
+        child.busy = True
+        frame = encode_message((request_id, script, parameters, helpers, options, cache_key, self.cache_size))
+        try:
+            view = memoryview(frame)
+            while view:
+                view = view[os.write(child.control_fd, view):]
+        except OSError:
+            # The session has exited; `read_child` will report the build as failed once its output closes
+            pass
+
+    def evict_sessions(self):
+        idle = sorted(
+            (child for child in self.sessions.values() if not child.busy),
+            key=lambda child: child.last_used,
+        )
+        for child in idle[:max(0, len(self.sessions) - MAX_SESSIONS)]:
+            del self.sessions[child.session]
+            child.responded = True
+            try:
+                os.kill(child.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+    def run_child(self, request_id, script: str, parameters, helpers, options, cache_key, write_fd: int, control_fd: int = None):
+        # Never returns; the child must not fall back into the zygote's loop.
+        # With a `control_fd` the child becomes a session, building every later build of the same object
+        # from the statements it has already executed.
+        def send(kind, payload):
+            try:
+                frame = encode_message((request_id, kind, payload))
+            except Exception:
+                # Exceptions raised by user scripts are not always picklable
+                frame = encode_message((request_id, kind, BlendQueryBuildException(traceback.format_exc())))
+            view = memoryview(frame)
+            while view:
+                view = view[os.write(write_fd, view):]
+
+        status = 1
+        try:
+            self.selector.close()
+            self.close_connections()
+            for fd, child in self.children.items():
+                os.close(fd)
+                if child.control_fd is not None:
+                    os.close(child.control_fd)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+            session = None
+            control = None
+            if control_fd is not None:
+                session = ScriptSession()
+                control = os.fdopen(control_fd, "rb")
+            cache_size = self.cache_size
+            while True:
+                result, status = self.run_build(send, script, parameters, helpers, options, cache_key, cache_size, session)
+                send("result", result)
+                if status == 0:
+                    # Hand newly tessellated shapes back to the zygote so that later builds inherit them. Only once the result
+                    # has been sent, as the zygote reads this before it forwards anything sent after it.
+                    import parse
+                    send("memo", parse.tessellation_memo.take_changes())
+                if control is None:
+                    break
+                try:
+                    request_id, script, parameters, helpers, options, cache_key, cache_size = read_message(control)
+                except EOFError:
+                    break
+        finally:
+            os._exit(status)
+
+    def close_connections(self):
+        # A build must not keep Blender's pipes open, nor write to them directly
+        os.close(self.input_fd)
+        os.close(self.output_fd)
+
+    def run_build(self, send, script: str, parameters, helpers, options, cache_key, cache_size: int, session: ScriptSession = None):
+        try:
+            if self.import_error is not None:
+                raise self.import_error
+            import parse
+            result = parse.build_parametric_script(script, options, cache_key, cache_size, send, session, parameters, helpers)
+            return result, 0
+        except Exception as exception:
+            return exception, 1
+
+    def read_child(self, child: Child):
+        data = os.read(child.fd, READ_SIZE)
+        if data:
+            for frame in child.buffer.feed(data):
+                request_id, kind, payload = pickle.loads(frame)
+                if kind == "memo":
+                    import parse
+                    parse.tessellation_memo.merge(payload)
+                    continue
+                if kind == "result":
+                    child.responded = True
+                self.forward(frame, request_id, kind, payload)
+                if kind == "result" and child.session is not None:
+                    # The session stays alive for the next build of its object, but no longer takes up a build slot
+                    child.busy = False
+                    child.last_used = time.monotonic()
+                    self.evict_sessions()
+                    self.schedule()
+            return
+
+        self.selector.unregister(child.fd)
+        os.close(child.fd)
+        if child.control_fd is not None:
+            os.close(child.control_fd)
+        if child.session is not None and self.sessions.get(child.session) is child:
+            del self.sessions[child.session]
+        del self.children[child.fd]
+        _, status = os.waitpid(child.pid, 0)
+        if not child.responded:
+            self.send((
+                child.request_id,
+                "result",
+                BlendQueryBuildException(f"Build process exited unexpectedly ({describe_status(status)})."),
+            ))
+        self.schedule()
+
+
+def encode_frame_prefix(frame: bytes) -> bytes:
+    # Children already produce complete pickled messages, so only the length header needs to be re-attached
+    return HEADER.pack(len(frame)) + frame
+
+
+def describe_status(status: int) -> str:
+    if os.WIFSIGNALED(status):
+        signal_number = os.WTERMSIG(status)
+        try:
+            return f"signal {signal.Signals(signal_number).name}"
+        except ValueError:
+            return f"signal {signal_number}"
+    return f"exit code {os.WEXITSTATUS(status)}"
+
+
+def main():
+    # Keep the protocol on a private descriptor and point stdout at stderr,
+    # so that `print` calls from user scripts cannot corrupt the message stream
+    output_fd = os.dup(sys.stdout.fileno())
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+    zygote = Zygote(sys.stdin.fileno(), output_fd)
+    zygote.warm()
+    zygote.serve()
+
+
+if __name__ == "__main__":
+    main()